@@ -0,0 +1,205 @@
+"""Micro-benchmarks for the per-plate preprocessing and parsing hot paths.
+
+Times enhance_plate, the crop/pad/resize block, clean_text and
+parse_paddleocr_result across input sizes, next to alternative
+implementations, and records per-call allocation counts and peak traced
+bytes:
+
+    python benchmarks/bench_micro.py --output micro.json
+    python benchmarks/bench_micro.py --only clean_text --compare micro.json
+"""
+import argparse
+import contextlib
+import os
+import re
+import statistics
+import time
+import tracemalloc
+
+import cv2
+
+from common import (compare_results, count_allocations, isolate_server_state, synthetic_frame,
+                    synthetic_plate, write_results)
+
+isolate_server_state()
+import main
+
+# --- Alternatives ----------------------------------------------------------
+
+def enhance_plate_uncached(image):
+    """Original enhancement: new CLAHE per call, gray->BGR expansion"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return cv2.cvtColor(clahe.apply(gray), cv2.COLOR_GRAY2BGR)
+
+def enhance_plate_gray(image):
+    """Cached CLAHE without the gray->BGR expansion"""
+    return main.get_clahe().apply(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+
+def crop_resize_inline(image, box):
+    """Original per-box crop/pad/resize block"""
+    x1, y1, x2, y2 = box
+    h, w = image.shape[:2]
+    pad = 20
+    crop = image[max(0, y1 - pad):min(h, y2 + pad), max(0, x1 - pad):min(w, x2 + pad)]
+    h_crop, w_crop = crop.shape[:2]
+    if h_crop < 40 or w_crop < 120:
+        scale = max(40/h_crop, 120/w_crop, 1.5)
+        crop = cv2.resize(crop, (int(w_crop * scale), int(h_crop * scale)))
+    return crop
+
+def crop_resize_buffered(image, box):
+    """crop_plate + resize into the per-thread batch buffer"""
+    crop = main.crop_plate(image, *box)
+    new_w, new_h = main.ocr_input_size(*crop.shape[:2])
+    slot = main.get_batch_buffer(1, new_h, new_w, 3)[0, :new_h, :new_w]
+    return cv2.resize(crop, (new_w, new_h), dst=slot)
+
+PUNCT_RE = re.compile(r'[^\w\s]')
+SPACE_RE = re.compile(r'\s+')
+
+def clean_text_compiled(text):
+    """clean_text with precompiled patterns"""
+    if not text:
+        return ""
+    cleaned = SPACE_RE.sub(' ', PUNCT_RE.sub('', str(text)).upper()).strip()
+    return cleaned if len(cleaned) >= 2 else ""
+
+def clean_text_split(text):
+    """clean_text using str.isalnum filtering and split/join"""
+    if not text:
+        return ""
+    kept = "".join(ch for ch in str(text) if ch.isalnum() or ch == "_" or ch.isspace())
+    cleaned = " ".join(kept.upper().split())
+    return cleaned if len(cleaned) >= 2 else ""
+
+# --- Inputs ------------------------------------------------------------------
+
+def plate_crops():
+    import random
+    rng = random.Random(0)
+    return {f"plate-{w}px": synthetic_plate(w, rng)[0] for w in (60, 160, 400)}
+
+def frame_boxes():
+    image, _ = synthetic_frame(1920, 1080, 0)
+    return image, {f"box-{w}x{h}": (900, 500, 900 + w, 500 + h)
+                   for w, h in ((40, 12), (160, 40), (480, 120))}
+
+def ocr_texts():
+    return {
+        "short": "ab",
+        "plate": "AB-12 cde",
+        "noisy": "  [AB]  12:::CDE  ~~ 4 5  ",
+        "long": "DEALER NAME MOTORS 555-0100 " * 4,
+    }
+
+def ocr_results(lines):
+    poly = [[0, 0], [100, 0], [100, 30], [0, 30]]
+    legacy = [[[poly, (f"AB{i:02d}CDE", 0.9)] for i in range(lines)]]
+    modern = [{
+        "rec_texts": [f"AB{i:02d}CDE" for i in range(lines)],
+        "rec_scores": [0.9] * lines,
+        "rec_polys": [poly] * lines,
+    }]
+    return {f"legacy-{lines}": legacy, f"dict-{lines}": modern}
+
+# --- Harness -------------------------------------------------------------------
+
+def measure(fn, arg, min_time):
+    """Median per-call time (us) over batches lasting about min_time seconds"""
+    fn(arg)
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn(arg)
+        if time.perf_counter() - started >= min_time / 5 or calls >= 1 << 20:
+            break
+        calls *= 2
+    samples = []
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn(arg)
+        samples.append((time.perf_counter() - started) / calls * 1e6)
+    return statistics.median(samples), min(samples)
+
+def allocations(fn, arg):
+    """Peak traced bytes and net retained blocks for one call"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn(arg)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "lineno"))
+    return peak - base, retained
+
+def suites():
+    crops = plate_crops()
+    image, boxes = frame_boxes()
+    return {
+        "enhance_plate": ([
+            ("enhance_plate", main.enhance_plate),
+            ("uncached_clahe", enhance_plate_uncached),
+            ("gray_only", enhance_plate_gray),
+            ("enhance_plates_batch", lambda crop: main.enhance_plates([crop])),
+        ], crops),
+        "crop_resize": ([
+            ("inline", lambda box: crop_resize_inline(image, box)),
+            ("buffered", lambda box: crop_resize_buffered(image, box)),
+        ], boxes),
+        "clean_text": ([
+            ("clean_text", main.clean_text),
+            ("compiled_regex", clean_text_compiled),
+            ("split_join", clean_text_split),
+        ], ocr_texts()),
+        "parse_paddleocr_result": ([
+            ("parse_paddleocr_result", main.parse_paddleocr_result),
+            ("parse_paddleocr_regions", main.parse_paddleocr_regions),
+        ], {**ocr_results(1), **ocr_results(4), **ocr_results(16)}),
+    }
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Hot-path micro-benchmarks")
+    parser.add_argument("--only", nargs="+", help="suites to run")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per measurement")
+    parser.add_argument("--output", default="bench_micro.json")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    args = parser.parse_args()
+
+    results = []
+    for suite, (variants, inputs) in suites().items():
+        if args.only and suite not in args.only:
+            continue
+        print(f"\n{suite}")
+        for input_name, arg in inputs.items():
+            for variant, fn in variants:
+                # Pipeline functions log per call; keep that out of the timings
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    median_us, best_us = measure(fn, arg, args.min_time)
+                    peak_bytes, retained = allocations(fn, arg)
+                    allocated = count_allocations(fn, arg)
+                scenario = f"{suite}/{variant}/{input_name}"
+                results.append({
+                    "scenario": scenario,
+                    "latency": {"p50_ms": median_us / 1000.0, "best_ms": best_us / 1000.0},
+                    "median_us": round(median_us, 3),
+                    "best_us": round(best_us, 3),
+                    "allocations": allocated,
+                    "peak_alloc_bytes": peak_bytes,
+                    "retained_blocks": retained,
+                })
+                print(f"  {variant:<26} {input_name:<14} {median_us:>10.2f} us  "
+                      f"allocs {allocated:>5}  peak {peak_bytes / 1024:>8.1f} KB  retained {retained:>4}")
+
+    write_results(args.output, "micro", vars(args), results)
+    if args.compare:
+        compare_results(args.compare, results, metric="p50_ms")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,159 @@
+"""End-to-end benchmark for the plate detection pipeline.
+
+Drives detect_image in-process (per-stage breakdown) or POST /detect/ on a
+running server, over a synthetic corpus swept across resolutions and
+plates-per-frame and/or a directory of real images:
+
+    python benchmarks/bench_pipeline.py --mode inprocess --output before.json
+    python benchmarks/bench_pipeline.py --mode http --url http://localhost:8000/detect/
+    python benchmarks/bench_pipeline.py --corpus ./samples --compare before.json
+
+In-process runs import main with the event store off and an empty
+watchlist directory, so benchmark frames are not recorded or alerted on.
+Memory is reported as resident size before and after each scenario
+(and its growth), plus the process-wide peak so far.
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import cv2
+import numpy as np
+
+from common import (compare_results, current_rss_mb, encode_jpeg, isolate_server_state,
+                    latency_summary, load_corpus, peak_rss_mb, post_image, synthetic_frame,
+                    write_results)
+
+RESOLUTIONS = {"480p": (854, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+
+def build_scenarios(args):
+    """[(scenario_name, [encoded_image, ...]), ...]"""
+    scenarios = []
+    if not args.no_synthetic:
+        for res_name in args.resolutions:
+            width, height = RESOLUTIONS[res_name]
+            for plates in args.plates:
+                frames = [encode_jpeg(synthetic_frame(width, height, plates, seed=i)[0])
+                          for i in range(args.frames)]
+                scenarios.append((f"synthetic-{res_name}-{plates}plates", frames))
+    if args.corpus:
+        corpus = load_corpus(args.corpus, args.frames)
+        if corpus:
+            scenarios.append((f"corpus-{len(corpus)}", [payload for _, payload in corpus]))
+    return scenarios
+
+def rss_fields(rss_start):
+    """Resident size around a scenario, plus the process peak so far"""
+    rss_end = current_rss_mb()
+    return {
+        "rss_start_mb": rss_start,
+        "rss_end_mb": rss_end,
+        "rss_growth_mb": round(rss_end - rss_start, 1) if rss_start is not None else None,
+        "process_peak_rss_mb": peak_rss_mb(),
+    }
+
+def run_inprocess(name, frames, args):
+    """Decode + detect_image per frame, collecting stage timings"""
+    isolate_server_state()
+    import main
+
+    rss_start = current_rss_mb()
+    latencies = []
+    stages = {}
+    plates = 0
+    started = time.perf_counter()
+    for i in range(args.warmup + args.repeat * len(frames)):
+        payload = frames[i % len(frames)]
+        timings = {}
+        frame_started = time.perf_counter()
+        # The pipeline logs every step; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            image = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+            timings["decode"] = (time.perf_counter() - frame_started) * 1000.0
+            detections = main.detect_image(image, timings=timings)
+        elapsed = (time.perf_counter() - frame_started) * 1000.0
+        if i < args.warmup:
+            started = time.perf_counter()
+            continue
+        latencies.append(elapsed)
+        plates += len(detections)
+        for stage, value in timings.items():
+            stages.setdefault(stage, []).append(value)
+    wall = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "mode": "inprocess",
+        "frames": len(latencies),
+        "plates_detected": plates,
+        "throughput_fps": round(len(latencies) / wall, 3) if wall > 0 else None,
+        "latency": latency_summary(latencies),
+        "stages": {stage: latency_summary(values) for stage, values in stages.items()},
+        **rss_fields(rss_start),
+    }
+
+def run_http(name, frames, args):
+    """POST each frame to a running server"""
+    rss_start = current_rss_mb()
+    latencies = []
+    errors = 0
+    plates = 0
+    started = time.perf_counter()
+    for i in range(args.warmup + args.repeat * len(frames)):
+        frame_started = time.perf_counter()
+        status, body = post_image(args.url, frames[i % len(frames)])
+        elapsed = (time.perf_counter() - frame_started) * 1000.0
+        if i < args.warmup:
+            started = time.perf_counter()
+            continue
+        if status != 200:
+            errors += 1
+            continue
+        latencies.append(elapsed)
+        plates += body.count(b'"box"')
+    wall = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "mode": "http",
+        "frames": len(latencies),
+        "errors": errors,
+        "plates_detected": plates,
+        "throughput_fps": round(len(latencies) / wall, 3) if wall > 0 else None,
+        "latency": latency_summary(latencies),
+        **{f"client_{key}": value for key, value in rss_fields(rss_start).items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end plate pipeline benchmark")
+    parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--url", default="http://localhost:8000/detect/")
+    parser.add_argument("--corpus", help="directory of real plate images")
+    parser.add_argument("--no-synthetic", action="store_true")
+    parser.add_argument("--resolutions", nargs="+", choices=sorted(RESOLUTIONS),
+                        default=["480p", "720p", "1080p"])
+    parser.add_argument("--plates", nargs="+", type=int, default=[0, 1, 4])
+    parser.add_argument("--frames", type=int, default=5, help="distinct frames per scenario")
+    parser.add_argument("--repeat", type=int, default=4, help="passes over the frames")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--output", default="bench_pipeline.json")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    args = parser.parse_args()
+
+    runner = run_inprocess if args.mode == "inprocess" else run_http
+    results = []
+    for name, frames in build_scenarios(args):
+        result = runner(name, frames, args)
+        results.append(result)
+        latency = result["latency"]
+        print(f"{name:<32} {result['throughput_fps'] or 0:>8.2f} fps  "
+              f"p50 {latency.get('p50_ms', 0):>9.2f}  p95 {latency.get('p95_ms', 0):>9.2f}  "
+              f"p99 {latency.get('p99_ms', 0):>9.2f} ms")
+
+    write_results(args.output, "pipeline", vars(args), results)
+    if args.compare:
+        compare_results(args.compare, results)
+
+if __name__ == "__main__":
+    main()
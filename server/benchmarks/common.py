@@ -0,0 +1,232 @@
+"""Shared helpers for the benchmark scripts.
+
+Run the scripts from the server directory so ./best.pt resolves, e.g.
+``python benchmarks/bench_pipeline.py``.
+"""
+import json
+import os
+import platform
+import random
+import resource
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+import urllib.error
+import urllib.request
+
+import cv2
+import numpy as np
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+def random_plate_text(rng):
+    """Random plate-like string, e.g. AB12 CDE"""
+    letters = string.ascii_uppercase
+    return ("".join(rng.choice(letters) for _ in range(2))
+            + "".join(rng.choice(string.digits) for _ in range(2)) + " "
+            + "".join(rng.choice(letters) for _ in range(3)))
+
+def synthetic_plate(width, rng):
+    """Render a white plate with black text, width pixels wide"""
+    height = max(12, int(width / 4.5))
+    plate = np.full((height, width, 3), 235, dtype=np.uint8)
+    cv2.rectangle(plate, (0, 0), (width - 1, height - 1), (20, 20, 20), max(1, height // 15))
+    text = random_plate_text(rng)
+    scale = height / 40.0
+    thickness = max(1, int(scale * 2))
+    (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+    origin = (max(0, (width - text_w) // 2), (height + text_h) // 2)
+    cv2.putText(plate, text, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, (10, 10, 10), thickness)
+    return plate, text
+
+def synthetic_frame(width, height, plates, seed=0):
+    """Textured frame with `plates` rendered plates; returns (image, texts)"""
+    rng = random.Random(seed)
+    noise = np.random.default_rng(seed).integers(0, 255, (height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+    image = cv2.resize(noise, (width, height), interpolation=cv2.INTER_LINEAR)
+    texts = []
+    for _ in range(plates):
+        plate_w = rng.randint(max(40, width // 16), max(41, width // 6))
+        plate, text = synthetic_plate(plate_w, rng)
+        h, w = plate.shape[:2]
+        if w >= width or h >= height:
+            continue
+        x, y = rng.randint(0, width - w), rng.randint(0, height - h)
+        image[y:y + h, x:x + w] = plate
+        texts.append(text)
+    return image, texts
+
+def load_corpus(directory, limit=None):
+    """Load (name, encoded_bytes) for the images in a directory"""
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as f:
+                corpus.append((name, f.read()))
+            if limit and len(corpus) >= limit:
+                break
+    return corpus
+
+def encode_jpeg(image, quality=90):
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return encoded.tobytes()
+
+def multipart_body(files, content_type="image/jpeg"):
+    """Encode [(field, filename, payload), ...] as multipart/form-data.
+
+    Returns (body, content_type_header).
+    """
+    boundary = uuid.uuid4().hex
+    body = b""
+    for field, filename, payload in files:
+        body += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode() + payload + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def post_image(url, payload, filename="frame.jpg", headers=None, timeout=60):
+    """POST an encoded image to /detect/-style endpoints; returns (status, body)"""
+    body, content_type = multipart_body([("file", filename, payload)])
+    request = urllib.request.Request(url, data=body, method="POST",
+                                     headers={"Content-Type": content_type, **(headers or {})})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def latency_summary(latencies_ms):
+    """Count, mean and tail percentiles of a list of latencies (ms)"""
+    if not latencies_ms:
+        return {"count": 0}
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+def isolate_server_state():
+    """Keep in-process benchmark frames out of the event store and watchlists.
+
+    Call before importing main.
+    """
+    os.environ["EVENT_STORE_ENABLED"] = "0"
+    os.environ["WATCHLIST_DIR"] = tempfile.mkdtemp(prefix="bench-watchlists-")
+
+def current_rss_mb():
+    """Current resident set size of this process in MB (None off Linux)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB.
+
+    This never goes down, so it is not a per-scenario figure; use
+    current_rss_mb() before and after a scenario for that.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def count_allocations(fn, *args):
+    """Number of memory blocks fn(*args) allocates, freed or not.
+
+    A tracemalloc snapshot is diffed at every Python line executed during
+    the call, so temporaries are counted even though they are gone by the
+    time it returns. Blocks allocated and freed within a single line
+    (including a name rebound to a new block from the same line) and memory
+    not reported to tracemalloc (e.g. inside OpenCV) are missed.
+    Slow; use for counting only, never for timing.
+    """
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    allocated = 0
+    previous = None
+
+    def step():
+        nonlocal allocated, previous
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+        if previous is not None:
+            allocated += sum(stat.count_diff for stat in snapshot.compare_to(previous, "lineno")
+                             if stat.count_diff > 0)
+        previous = snapshot
+
+    def tracer(frame, event, arg):
+        if event in ("line", "return"):
+            step()
+        return tracer
+
+    tracemalloc.start()
+    try:
+        step()
+        sys.settrace(tracer)
+        try:
+            fn(*args)
+        finally:
+            sys.settrace(None)
+        step()
+    finally:
+        tracemalloc.stop()
+    return allocated
+
+def environment_info():
+    """Version/host details stored alongside results for later comparison"""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+                                  capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        revision = None
+    return {
+        "git_revision": revision or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "timestamp": time.time(),
+    }
+
+def write_results(path, benchmark, config, results):
+    """Write machine-readable results as JSON"""
+    with open(path, "w") as f:
+        json.dump({
+            "benchmark": benchmark,
+            "environment": environment_info(),
+            "config": config,
+            "results": results,
+        }, f, indent=2)
+    print(f"📄 Results written to {path}")
+
+def compare_results(baseline_path, results, metric="p95_ms"):
+    """Print per-scenario change of a metric against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+    print(f"\nComparison against {baseline_path} ({metric}):")
+    for result in results:
+        before = baseline.get(result["scenario"], {}).get("latency", {}).get(metric)
+        after = result.get("latency", {}).get(metric)
+        if before is None or after is None:
+            print(f"  {result['scenario']:<32} (no baseline)")
+            continue
+        change = (after - before) / before * 100.0 if before else 0.0
+        print(f"  {result['scenario']:<32} {before:>10.2f} -> {after:>10.2f} ({change:+.1f}%)")
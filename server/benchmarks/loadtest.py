@@ -0,0 +1,223 @@
+"""HTTP load generator for the detection server.
+
+Closed-loop mode sweeps concurrency (each worker sends its next request
+when the previous one returns) and reports the saturation point. Open-loop
+mode sends at fixed arrival rates and measures latency from each request's
+scheduled send time, so queueing delay is not hidden by a stalled client
+(coordinated omission):
+
+    python benchmarks/loadtest.py --start-server --concurrency 1 2 4 8 16
+    python benchmarks/loadtest.py --mode open --rates 1 2 5 10 --duration 20
+    python benchmarks/loadtest.py --target jobs --concurrency 1 2 4
+
+Targets are /detect/ and the batch /jobs API; the server has no streaming
+detection endpoint to drive.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from common import (SERVER_DIR, encode_jpeg, latency_summary, multipart_body, post_image,
+                    synthetic_frame, write_results)
+
+def start_server(port):
+    """Launch uvicorn in the server directory and wait until it answers"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 180
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/test", timeout=2):
+                return process
+        except Exception:
+            time.sleep(1)
+    process.terminate()
+    raise RuntimeError("Server did not start within 180s")
+
+def detect_request(base_url, payload):
+    status, _ = post_image(f"{base_url}/detect/", payload)
+    return status == 200
+
+def jobs_request(base_url, payloads, poll_interval=0.2):
+    """Submit a batch job and poll it to completion"""
+    body, content_type = multipart_body(
+        [("files", f"frame{i}.jpg", payload) for i, payload in enumerate(payloads)])
+    request = urllib.request.Request(f"{base_url}/jobs", data=body, method="POST",
+                                     headers={"Content-Type": content_type})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        job_id = json.loads(response.read())["id"]
+    while True:
+        with urllib.request.urlopen(f"{base_url}/jobs/{job_id}", timeout=60) as response:
+            status = json.loads(response.read())["status"]
+        if status in ("done", "failed"):
+            return status == "done"
+        time.sleep(poll_interval)
+
+def closed_loop(send, concurrency, duration):
+    """Run `concurrency` workers back-to-back for duration seconds"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker():
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                ok = send()
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000.0
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.monotonic() - started
+
+def open_loop(send, rate, duration, max_in_flight):
+    """Send at a fixed rate; latency counts from each scheduled send time"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def fire(scheduled):
+        try:
+            ok = send()
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - scheduled) * 1000.0
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+
+    total = int(rate * duration)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for i in range(total):
+            scheduled = started + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, scheduled)
+    return latencies, errors[0], time.perf_counter() - started
+
+def find_saturation(results, min_gain=0.05, max_error_rate=0.01):
+    """First step where throughput stops improving or errors appear"""
+    best = None
+    for result in results:
+        if result["error_rate"] > max_error_rate:
+            return result["load"]
+        if best is not None and result["throughput_rps"] < best * (1 + min_gain):
+            return result["load"]
+        best = max(best or 0, result["throughput_rps"])
+    return None
+
+def plot(results, path, mode):
+    """Throughput vs p50/p99 latency chart (needs matplotlib)"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️ matplotlib not installed; skipping plot")
+        return
+    throughput = [r["throughput_rps"] for r in results]
+    figure, axis = plt.subplots(figsize=(7, 4.5))
+    for metric in ("p50_ms", "p99_ms"):
+        axis.plot(throughput, [r["latency"].get(metric, 0) for r in results], marker="o",
+                  label=metric.replace("_ms", ""))
+    for r in results:
+        axis.annotate(str(r["load"]), (r["throughput_rps"], r["latency"].get("p99_ms", 0)),
+                      fontsize=8, textcoords="offset points", xytext=(4, 4))
+    axis.set_xlabel("throughput (req/s)")
+    axis.set_ylabel("latency (ms)")
+    axis.set_title(f"{mode}-loop: throughput vs latency")
+    axis.legend()
+    figure.tight_layout()
+    figure.savefig(path)
+    print(f"📈 Plot written to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection server load test")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start-server", action="store_true", help="launch uvicorn locally")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--target", choices=("detect", "jobs"), default="detect")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--rates", nargs="+", type=float, default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=15, help="seconds per step")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--resolution", nargs=2, type=int, default=[1280, 720])
+    parser.add_argument("--plates", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=4, help="images per job")
+    parser.add_argument("--output", default="loadtest.json")
+    parser.add_argument("--plot", default="loadtest.png")
+    args = parser.parse_args()
+
+    server = start_server(args.port) if args.start_server else None
+    base_url = f"http://127.0.0.1:{args.port}" if server else args.url.rstrip("/")
+    frames = [encode_jpeg(synthetic_frame(*args.resolution, args.plates, seed=i)[0]) for i in range(8)]
+    counter = iter(range(1 << 62))
+
+    def send():
+        i = next(counter)
+        if args.target == "jobs":
+            return jobs_request(base_url, [frames[(i + k) % len(frames)] for k in range(args.batch_size)])
+        return detect_request(base_url, frames[i % len(frames)])
+
+    results = []
+    try:
+        loads = args.concurrency if args.mode == "closed" else args.rates
+        for load in loads:
+            if args.mode == "closed":
+                latencies, errors, wall = closed_loop(send, load, args.duration)
+            else:
+                latencies, errors, wall = open_loop(send, load, args.duration, args.max_in_flight)
+            total = len(latencies) + errors
+            result = {
+                "scenario": f"{args.target}-{args.mode}-{load}",
+                "load": load,
+                "requests": total,
+                "errors": errors,
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "throughput_rps": round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+                "latency": latency_summary(latencies),
+            }
+            results.append(result)
+            print(f"{args.mode} {load:>6}: {result['throughput_rps']:>8.2f} req/s  "
+                  f"p50 {result['latency'].get('p50_ms', 0):>9.1f}  "
+                  f"p99 {result['latency'].get('p99_ms', 0):>9.1f} ms  errors {errors}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    saturation = find_saturation(results)
+    print(f"🔥 Saturation at {args.mode}-loop load {saturation}" if saturation is not None
+          else "No saturation reached in this sweep")
+    write_results(args.output, "loadtest", dict(vars(args), saturation=saturation), results)
+    if args.plot:
+        plot(results, args.plot, args.mode)
+
+if __name__ == "__main__":
+    main()
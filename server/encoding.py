@@ -0,0 +1,90 @@
+"""Binary response encodings negotiated from the Accept header.
+
+application/msgpack (needs `msgpack`) and application/cbor (needs `cbor2`)
+are served when the client asks for them and the package is installed;
+anything else gets the regular JSON response. Binary payloads carry
+detection lists in columnar form:
+
+    {"count": 2, "box": [x1, y1, x2, y2, x1, y1, x2, y2],
+     "text": ["AB12CDE", "XY34ZZZ"], "yolo_confidence": [...], ...}
+
+so field names are sent once per list instead of once per plate. Fields
+missing from some detections are None in those rows; an empty list is
+{"count": 0}.
+"""
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+CBOR_TYPES = ("application/cbor",)
+
+def negotiate(accept):
+    """Pick "msgpack", "cbor" or "json" from an Accept header.
+
+    Media types are tried in descending q order; unavailable encoders are
+    skipped, and JSON is the fallback.
+    """
+    offers = []
+    for position, item in enumerate((accept or "").split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            offers.append((-quality, position, media_type.lower()))
+    for _, _, media_type in sorted(offers):
+        if media_type in MSGPACK_TYPES and msgpack is not None:
+            return "msgpack"
+        if media_type in CBOR_TYPES and cbor2 is not None:
+            return "cbor"
+        if media_type in ("application/json", "application/*", "*/*"):
+            return "json"
+    return "json"
+
+def columnar(detections):
+    """Detection dicts -> one list per field, boxes flattened"""
+    fields = []
+    for det in detections:
+        for key in det:
+            if key not in fields:
+                fields.append(key)
+    table = {"count": len(detections)}
+    for key in fields:
+        if key == "box":
+            table["box"] = [int(v) for det in detections for v in det["box"]]
+        else:
+            table[key] = [det.get(key) for det in detections]
+    return table
+
+def compact(payload, nested=False):
+    """Copy of payload with its "results" detections in columnar form.
+
+    With nested, "results" is a list of per-file/frame entries (as in a
+    job) and each entry's own "results" is converted instead.
+    """
+    out = dict(payload)
+    if nested:
+        out["results"] = [compact(entry) for entry in payload["results"]]
+    else:
+        out["results"] = columnar(payload.get("results", []))
+    return out
+
+def encode(payload, encoding, nested=False):
+    """(body bytes, media type) for a negotiated binary encoding"""
+    if encoding == "msgpack":
+        return msgpack.packb(compact(payload, nested), use_bin_type=True), MSGPACK_TYPES[0]
+    if encoding == "cbor":
+        return cbor2.dumps(compact(payload, nested)), CBOR_TYPES[0]
+    raise ValueError(f"Unknown encoding: {encoding}")
@@ -0,0 +1,53 @@
+"""Confusion-aware plate matching shared by search and watchlists.
+
+Characters OCR commonly confuses are folded onto one representative, so
+confusable reads share a key, and symmetric-delete variants of the folded
+key find reads one real edit away without scanning.
+"""
+
+# OCR confusion classes, folded onto the digit
+CONFUSION_CLASSES = ("0OQD", "1IL", "2Z", "5S", "6G", "8B")
+CONFUSION_COST = 0.3
+
+FOLD = {ch: group[0] for group in CONFUSION_CLASSES for ch in group}
+FOLD_TABLE = str.maketrans(FOLD)
+
+def fold_confusions(plate):
+    """Map confusable characters of a normalized plate onto one representative"""
+    return plate.translate(FOLD_TABLE)
+
+def delete_variants(key):
+    """All strings obtained by deleting one character from key"""
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+def index_keys(plate):
+    """Keys under which a normalized plate is indexed (folded + 1-deletes)"""
+    folded = fold_confusions(plate)
+    return {folded} | delete_variants(folded)
+
+def substitution_cost(a, b):
+    """Cost of reading b where a was written"""
+    if a == b:
+        return 0.0
+    if FOLD.get(a, a) == FOLD.get(b, b):
+        return CONFUSION_COST
+    return 1.0
+
+def confusion_distance(a, b, max_distance=None):
+    """Edit distance where confusable substitutions are cheap.
+
+    Returns early with a value above max_distance once every path exceeds it.
+    """
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [float(i)]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1.0,
+                current[j - 1] + 1.0,
+                previous[j - 1] + substitution_cost(ca, cb),
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return min(current)
+        previous = current
+    return previous[-1]
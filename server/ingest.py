@@ -0,0 +1,404 @@
+"""Offline bulk ingest of image directories and archives.
+
+Reads every image under a directory, or inside a .tar/.zip archive,
+decodes them on a thread pool and runs batched detection in-process,
+writing one row per plate read to JSONL, CSV or Parquet (a directory of
+part files):
+
+    python ingest.py /data/frames --output reads.parquet
+    python ingest.py backfill.tar --output reads.csv --batch-size 16 --decode-workers 8
+    python ingest.py backfill.tar --output reads.csv --resume
+
+Plain files, uncompressed tar members and stored zip members are
+memory-mapped and decoded straight from the mapping; compressed members
+are read into memory first. Run from the server directory (the model
+paths are relative). The event store is off unless --record-events is
+given.
+
+Progress is checkpointed (<output>.checkpoint.json) every
+--checkpoint-every files, after the output has been synced. --resume
+truncates the output back to the last checkpoint and continues from the
+next unprocessed file, so an interrupted run yields exactly the rows of
+an uninterrupted one.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+OUTPUT_COLUMNS = ["index", "file", "x1", "y1", "x2", "y2", "text", "yolo_confidence", "ocr_confidence"]
+
+def is_image(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+def map_file(path):
+    """Read-only mapping of a whole file (empty files map to b"")"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# --- Sources: each yields (name, load) where load() returns the encoded bytes
+
+def directory_entries(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if is_image(filename):
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, root), lambda path=path: map_file(path)
+
+def tar_entries(path, start=0):
+    try:
+        archive = tarfile.open(path, "r:")
+    except tarfile.ReadError:
+        archive = None
+    if archive is not None:
+        # Uncompressed: members are contiguous byte ranges of the archive
+        mapping = map_file(path)
+        with archive:
+            for member in archive:
+                if member.isfile() and is_image(member.name):
+                    data_start, data_end = member.offset_data, member.offset_data + member.size
+                    yield member.name, (lambda data_start=data_start, data_end=data_end:
+                                        memoryview(mapping)[data_start:data_end])
+        return
+    # Compressed tars can only be read sequentially; skip reading resumed-over members
+    with tarfile.open(path, "r:*") as archive:
+        index = 0
+        for member in archive:
+            if member.isfile() and is_image(member.name):
+                data = archive.extractfile(member).read() if index >= start else b""
+                yield member.name, lambda data=data: data
+                index += 1
+
+def zip_entries(path, start=0):
+    mapping = map_file(path)
+    with zipfile.ZipFile(path) as archive:
+        index = 0
+        for info in archive.infolist():
+            if info.is_dir() or not is_image(info.filename):
+                continue
+            if info.compress_type == zipfile.ZIP_STORED:
+                # Local header: 30 fixed bytes, then name and extra field
+                name_len, extra_len = struct.unpack_from("<HH", mapping, info.header_offset + 26)
+                offset = info.header_offset + 30 + name_len + extra_len
+                yield info.filename, lambda offset=offset, size=info.file_size: memoryview(mapping)[offset:offset + size]
+            else:
+                # Inflate here: the archive is closed once this generator ends,
+                # while decode tasks for the last batches may still be queued
+                data = archive.read(info.filename) if index >= start else b""
+                yield info.filename, lambda data=data: data
+            index += 1
+
+def iter_entries(path, start=0):
+    if os.path.isdir(path):
+        return directory_entries(path)
+    if zipfile.is_zipfile(path):
+        return zip_entries(path, start)
+    if tarfile.is_tarfile(path):
+        return tar_entries(path, start)
+    raise ValueError(f"{path} is not a directory, tar or zip archive")
+
+def count_entries(path):
+    """Number of images in the input, or None when that needs a full decompress"""
+    if os.path.isdir(path):
+        return sum(1 for _ in directory_entries(path))
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return sum(1 for info in archive.infolist() if not info.is_dir() and is_image(info.filename))
+    try:
+        with tarfile.open(path, "r:") as archive:
+            return sum(1 for member in archive if member.isfile() and is_image(member.name))
+    except tarfile.ReadError:
+        return None
+
+def decode_entry(load):
+    """Decode one entry to BGR, or None if it is not a readable image"""
+    data = load()
+    if len(data) == 0:
+        return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+def decoded_batches(entries, pool, batch_size, prefetch, start=0):
+    """Yield [(index, name, image)] batches from entry start on, decoding
+    ahead on the pool"""
+    queued = deque()
+    batch = []
+    for index, (name, load) in enumerate(entries):
+        if index < start:
+            continue
+        batch.append((index, name, pool.submit(decode_entry, load)))
+        if len(batch) == batch_size:
+            queued.append(batch)
+            batch = []
+            if len(queued) > prefetch:
+                yield resolve(queued.popleft())
+    if batch:
+        queued.append(batch)
+    while queued:
+        yield resolve(queued.popleft())
+
+def resolve(batch):
+    out = []
+    for index, name, future in batch:
+        try:
+            image = future.result()
+        except Exception as e:
+            print(f"⚠️ {name}: {e}", file=sys.stderr)
+            image = None
+        out.append((index, name, image))
+    return out
+
+# --- Writers ---------------------------------------------------------------------
+#
+# Writers start fresh (position None) or reopen at a position returned by
+# commit(), discarding anything written after it.
+
+class JsonlWriter:
+    def __init__(self, path, position=None):
+        if position is not None:
+            os.truncate(path, position)
+        self.file = open(path, "w" if position is None else "a", newline="")
+        self.start()
+
+    def start(self):
+        pass
+
+    def write(self, rows):
+        self.file.writelines(json.dumps(row) + "\n" for row in rows)
+
+    def commit(self):
+        """Make everything written so far durable; returns the byte offset"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+class CsvWriter(JsonlWriter):
+    def start(self):
+        self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_COLUMNS)
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+class ParquetWriter:
+    """Writes path/part-NNNNN.parquet, one part per commit (needs pyarrow)"""
+    def __init__(self, path, position=None, row_group_size=65536):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.schema = pa.schema([
+            ("index", pa.int64()), ("file", pa.string()),
+            ("x1", pa.int32()), ("y1", pa.int32()), ("x2", pa.int32()), ("y2", pa.int32()),
+            ("text", pa.string()), ("yolo_confidence", pa.float32()), ("ocr_confidence", pa.float32()),
+        ])
+        self.path = path
+        self.parts = position or 0
+        self.row_group_size = row_group_size
+        self.rows = []
+        self.writer = None
+        os.makedirs(path, exist_ok=True)
+        for filename in os.listdir(path):
+            number = filename[5:-len(".parquet")]
+            if filename.startswith("part-") and number.isdigit() and int(number) >= self.parts:
+                os.remove(os.path.join(path, filename))
+
+    def write(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.writer is None:
+            part = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+            self.writer = self.pq.ParquetWriter(part, self.schema)
+        self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+        self.rows = []
+
+    def commit(self):
+        """Close the current part; returns the number of complete parts"""
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.parts += 1
+        return self.parts
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+WRITERS = {".jsonl": JsonlWriter, ".csv": CsvWriter, ".parquet": ParquetWriter}
+
+def open_writer(path, position=None):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"Output must end in one of {', '.join(WRITERS)}")
+    return WRITERS[extension](path, position)
+
+# --- Checkpoints -------------------------------------------------------------------
+
+def load_checkpoint(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint file"""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s"
+
+def report_progress(checkpoint, session_files, session_seconds):
+    """Log processed/total, throughput over this session and ETA"""
+    files, total = checkpoint["next_index"], checkpoint["total"]
+    rate = session_files / session_seconds if session_seconds > 0 else 0.0
+    line = f"📦 {files}"
+    if total:
+        line += f"/{total} files ({100.0 * files / total:.1f}%)"
+    else:
+        line += " files"
+    line += f", {checkpoint['plates']} plates, {checkpoint['failed']} unreadable, {rate:.1f} files/s"
+    if total and rate > 0:
+        line += f", ETA {format_eta((total - files) / rate)}"
+    print(line)
+
+def detection_rows(index, name, detections):
+    return [{
+        "index": index,
+        "file": name,
+        "x1": det["box"][0], "y1": det["box"][1], "x2": det["box"][2], "y2": det["box"][3],
+        "text": det["text"],
+        "yolo_confidence": det["yolo_confidence"],
+        "ocr_confidence": det["ocr_confidence"],
+    } for det in detections]
+
+def ingest(args):
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint.json"
+    if args.resume and os.path.exists(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint["input"] != os.path.abspath(args.input):
+            raise SystemExit(f"Checkpoint is for {checkpoint['input']}, not {args.input}")
+        if checkpoint["done"]:
+            print(f"✅ Already complete: {checkpoint['next_index']} files, {checkpoint['plates']} plates")
+            return
+        print(f"🔁 Resuming at file {checkpoint['next_index']}")
+    elif os.path.exists(checkpoint_path):
+        raise SystemExit(f"{checkpoint_path} exists; pass --resume to continue or delete it to start over")
+    else:
+        checkpoint = {
+            "input": os.path.abspath(args.input),
+            "output": os.path.abspath(args.output),
+            "next_index": 0,
+            "output_position": None,
+            "files": 0,
+            "plates": 0,
+            "failed": 0,
+            "total": count_entries(args.input),
+            "elapsed_seconds": 0.0,
+            "done": False,
+        }
+
+    if not args.record_events:
+        os.environ["EVENT_STORE_ENABLED"] = "0"
+    import main
+
+    writer = open_writer(args.output, checkpoint["output_position"])
+    progress = dict(checkpoint)
+    started = time.monotonic()
+    since_checkpoint = 0
+    # False while a batch's rows are written but not yet counted in progress
+    consistent = True
+
+    def commit(done=False):
+        """Sync the output, then record everything up to it as processed"""
+        progress["output_position"] = writer.commit()
+        progress["elapsed_seconds"] = checkpoint["elapsed_seconds"] + time.monotonic() - started
+        progress["updated_at"] = time.time()
+        progress["done"] = done
+        save_checkpoint(checkpoint_path, progress)
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.decode_workers, thread_name_prefix="decode") as pool:
+            entries = iter_entries(args.input, checkpoint["next_index"])
+            for batch in decoded_batches(entries, pool, args.batch_size, args.prefetch,
+                                         checkpoint["next_index"]):
+                images = [item for item in batch if item[2] is not None]
+                # The pipeline logs every step; keep the ingest output readable
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    results = main.detect_images([image for _, _, image in images], args.source)
+                rows = []
+                for (index, name, _), detections in zip(images, results):
+                    rows.extend(detection_rows(index, name, detections))
+                consistent = False
+                writer.write(rows)
+                progress["next_index"] = batch[-1][0] + 1
+                progress["files"] += len(batch)
+                progress["plates"] += len(rows)
+                progress["failed"] += len(batch) - len(images)
+                consistent = True
+                since_checkpoint += len(batch)
+                if since_checkpoint >= args.checkpoint_every:
+                    commit()
+                    since_checkpoint = 0
+                if progress["files"] % args.log_every < len(batch):
+                    session_files = progress["next_index"] - checkpoint["next_index"]
+                    report_progress(progress, session_files, time.monotonic() - started)
+        commit(done=True)
+    except BaseException:
+        # Rows of finished batches are complete, so checkpoint them before exiting
+        if consistent:
+            commit()
+            print(f"💾 Checkpointed at file {progress['next_index']}; rerun with --resume")
+        raise
+    finally:
+        writer.close()
+    print(f"🎉 Ingested {progress['files']} files ({progress['failed']} unreadable), "
+          f"{progress['plates']} plates in {progress['elapsed_seconds']:.1f}s")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Bulk plate detection over local images")
+    parser.add_argument("input", help="directory, .tar(.gz) or .zip of images")
+    parser.add_argument("--output", required=True, help="results file (.jsonl, .csv or .parquet)")
+    parser.add_argument("--source", help="camera/source name for ROI and plate formats")
+    parser.add_argument("--batch-size", type=int, default=8, help="frames per YOLO call")
+    parser.add_argument("--decode-workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--prefetch", type=int, default=2, help="batches decoded ahead")
+    parser.add_argument("--log-every", type=int, default=1000, help="files between progress lines")
+    parser.add_argument("--checkpoint", help="checkpoint file (default <output>.checkpoint.json)")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="files between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+    parser.add_argument("--record-events", action="store_true", help="also record reads in the event store")
+    args = parser.parse_args()
+    ingest(args)
+
+if __name__ == "__main__":
+    main_cli()
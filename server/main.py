@@ -1,10 +1,34 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Body, Header, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import defaultdict, deque
+from typing import List, Optional
+from urllib.parse import urlparse
+import urllib.request
+import asyncio
+import contextlib
+import contextvars
+import shutil
+import hmac
+import math
 import cv2
 import numpy as np
 from ultralytics import YOLO
+import json
 import re
 import os
+import tempfile
+import threading
+import time
+import uuid
+
+import encoding
+from store import EventStore
+from plate_formats import PlateFormatEngine
+from profiler import collapsed, profile_call, sample_stacks
+from tracing import tracer_from_env
+from watchlist import WatchlistRegistry, is_valid_name
 
 # Initialize YOLO
 yolo_model = YOLO("./best.pt")
@@ -22,8 +46,119 @@ except Exception as e:
     print(f"❌ PaddleOCR failed: {e}")
     ocr_status = f"Failed: {str(e)}"
 
+# Request tracing (TRACE_EXPORT=file:<path> or otlp:<url>; unset disables)
+tracer = tracer_from_env()
+
+# Per-camera regions of interest: {source: [[x, y], ...]} in frame pixels
+ROI_CONFIG_PATH = os.environ.get("ROI_CONFIG_PATH", "./roi.json")
+roi_polygons = {}
+
+def load_roi_config():
+    """Load ROI polygons from disk"""
+    global roi_polygons
+    if not os.path.exists(ROI_CONFIG_PATH):
+        return
+    try:
+        with open(ROI_CONFIG_PATH) as f:
+            roi_polygons = json.load(f)
+        print(f"✅ Loaded ROI for {len(roi_polygons)} source(s)")
+    except Exception as e:
+        print(f"❌ ROI config failed: {e}")
+
+def save_roi_config():
+    """Persist ROI polygons atomically"""
+    tmp_path = ROI_CONFIG_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(roi_polygons, f, indent=2)
+    os.replace(tmp_path, ROI_CONFIG_PATH)
+
+load_roi_config()
+
+# Detection event store (SQLite/WAL, written off the request path)
+EVENT_DB_PATH = os.environ.get("EVENT_DB_PATH", "./events.db")
+EVENT_QUEUE_MAX = int(os.environ.get("EVENT_QUEUE_MAX", "100000"))
+event_store = None
+if os.environ.get("EVENT_STORE_ENABLED", "1") == "1":
+    try:
+        event_store = EventStore(EVENT_DB_PATH, max_pending=EVENT_QUEUE_MAX)
+        print(f"✅ Event store ready: {EVENT_DB_PATH}")
+    except Exception as e:
+        print(f"❌ Event store failed: {e}")
+
+# Per-region plate syntax, compiled once at startup
+PLATE_FORMATS_PATH = os.environ.get("PLATE_FORMATS_PATH", "./plate_formats.json")
+try:
+    plate_formats = PlateFormatEngine.from_file(PLATE_FORMATS_PATH)
+    if plate_formats.regions:
+        print(f"✅ Plate formats loaded for {len(plate_formats.regions)} region(s)")
+except Exception as e:
+    print(f"❌ Plate formats failed: {e}")
+    plate_formats = PlateFormatEngine()
+
+# Watchlists are compiled at startup and on upload, then swapped atomically
+WATCHLIST_DIR = os.environ.get("WATCHLIST_DIR", "./watchlists")
+watchlists = WatchlistRegistry(WATCHLIST_DIR)
+try:
+    watchlists.load_all()
+    if watchlists.lists:
+        print(f"✅ Loaded {len(watchlists.lists)} watchlist(s)")
+except Exception as e:
+    print(f"❌ Watchlist load failed: {e}")
+
 app = FastAPI()
 
+# Upload size caps, enforced while the body streams in rather than after
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(32 * 1024 * 1024)))
+MAX_JOB_UPLOAD_BYTES = int(os.environ.get("MAX_JOB_UPLOAD_BYTES", str(2 * 1024 ** 3)))
+UPLOAD_LIMITS = {"/jobs": MAX_JOB_UPLOAD_BYTES}
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR") or None
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, limit):
+        super().__init__(status_code=413, detail=f"Upload exceeds {limit} bytes")
+
+def upload_too_large_response(exc):
+    return JSONResponse(status_code=413, content={"error": exc.detail, "results": []})
+
+class UploadLimitMiddleware:
+    """Reject request bodies over the route's limit as soon as they are.
+
+    A declared Content-Length over the limit is refused before reading;
+    otherwise bytes are counted as they arrive and UploadTooLarge is raised
+    from receive(), aborting the multipart parse mid-stream.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = UPLOAD_LIMITS.get(scope["path"].rstrip("/"), MAX_UPLOAD_BYTES)
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared and declared.isdigit() and int(declared) > limit:
+            response = upload_too_large_response(UploadTooLarge(limit))
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise UploadTooLarge(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+@app.exception_handler(UploadTooLarge)
+async def handle_upload_too_large(request, exc):
+    return upload_too_large_response(exc)
+
+# CORS goes on last so it wraps the limit and 413s carry CORS headers
+app.add_middleware(UploadLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -32,13 +167,235 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# PaddleOCR converts 2-D input to BGR itself, so gray crops can be passed as-is
+OCR_GRAYSCALE_INPUT = os.environ.get("OCR_GRAYSCALE_INPUT", "1") == "1"
+
+# CLAHE objects and batch buffers are reused per thread
+_enhance_local = threading.local()
+
+def get_clahe():
+    """Return this thread's CLAHE instance"""
+    clahe = getattr(_enhance_local, "clahe", None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        _enhance_local.clahe = clahe
+    return clahe
+
+def get_batch_buffer(n, h, w, channels):
+    """Return this thread's batch buffer, grown to hold n crops of h x w"""
+    shape = (n, h, w, channels) if channels > 1 else (n, h, w)
+    buf = getattr(_enhance_local, "batch", None)
+    if buf is not None and buf.ndim == len(shape):
+        if all(have >= need for have, need in zip(buf.shape, shape)):
+            return buf
+        shape = tuple(max(have, need) for have, need in zip(buf.shape, shape))
+    buf = np.empty(shape, dtype=np.uint8)
+    _enhance_local.batch = buf
+    return buf
+
 def enhance_plate(image):
     """Enhance license plate for OCR"""
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    enhanced = clahe.apply(gray)
+    enhanced = get_clahe().apply(gray)
     return cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
 
+def ocr_input_size(h_crop, w_crop):
+    """Target (w, h) for an OCR crop, upscaling small plates"""
+    if h_crop < 40 or w_crop < 120:
+        scale = max(40/h_crop, 120/w_crop, 1.5)
+        return int(w_crop * scale), int(h_crop * scale)
+    return w_crop, h_crop
+
+# Crop quality thresholds for adaptive enhancement
+QUALITY_MIN_HEIGHT = int(os.environ.get("QUALITY_MIN_HEIGHT", "24"))
+QUALITY_MIN_WIDTH = int(os.environ.get("QUALITY_MIN_WIDTH", "48"))
+QUALITY_MIN_SHARPNESS = float(os.environ.get("QUALITY_MIN_SHARPNESS", "15"))
+QUALITY_SHARPEN_BELOW = float(os.environ.get("QUALITY_SHARPEN_BELOW", "100"))
+QUALITY_MIN_CONTRAST = float(os.environ.get("QUALITY_MIN_CONTRAST", "40"))
+QUALITY_BRIGHTNESS_RANGE = (
+    float(os.environ.get("QUALITY_MIN_BRIGHTNESS", "60")),
+    float(os.environ.get("QUALITY_MAX_BRIGHTNESS", "190")),
+)
+
+def assess_plate_quality(gray, box_size=None):
+    """Pick an enhancement for a gray crop from cheap quality metrics.
+
+    box_size is the (width, height) of the detected plate box; the size
+    check uses it rather than the padded crop. Returns (decision, metrics)
+    where decision is one of "skip", "none", "clahe" or "sharpen".
+    """
+    w, h = box_size if box_size is not None else gray.shape[1::-1]
+    mean, std = cv2.meanStdDev(gray)
+    metrics = {
+        "brightness": float(mean[0][0]),
+        "contrast": float(std[0][0]),
+        "sharpness": float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+    }
+
+    if h < QUALITY_MIN_HEIGHT or w < QUALITY_MIN_WIDTH:
+        return "skip", metrics
+    if metrics["sharpness"] < QUALITY_MIN_SHARPNESS:
+        return "skip", metrics
+    if metrics["sharpness"] < QUALITY_SHARPEN_BELOW:
+        return "sharpen", metrics
+    low, high = QUALITY_BRIGHTNESS_RANGE
+    if metrics["contrast"] < QUALITY_MIN_CONTRAST or not low <= metrics["brightness"] <= high:
+        return "clahe", metrics
+    return "none", metrics
+
+def sharpen_plate(gray):
+    """Unsharp mask for mildly blurred crops"""
+    blurred = cv2.GaussianBlur(gray, (0, 0), 3)
+    return cv2.addWeighted(gray, 1.5, blurred, -0.5, 0)
+
+# Rectified, single-line plates skip PaddleOCR's detection/classifier stages
+RECTIFY_MIN_AREA = float(os.environ.get("RECTIFY_MIN_AREA", "0.2"))
+RECTIFY_MIN_ASPECT = float(os.environ.get("RECTIFY_MIN_ASPECT", "1.8"))
+OCR_REC_ONLY_RECTIFIED = os.environ.get("OCR_REC_ONLY_RECTIFIED", "1") == "1"
+
+def order_corners(corners):
+    """Order 4 points as top-left, top-right, bottom-right, bottom-left"""
+    corners = np.asarray(corners, dtype=np.float32).reshape(4, 2)
+    sums = corners.sum(axis=1)
+    diffs = np.diff(corners, axis=1).ravel()
+    return np.array([
+        corners[np.argmin(sums)],
+        corners[np.argmin(diffs)],
+        corners[np.argmax(sums)],
+        corners[np.argmax(diffs)],
+    ], dtype=np.float32)
+
+def rectify_plate(gray):
+    """Deskew a gray crop to the plate outline via a perspective warp.
+
+    Returns the tightly cropped plate, or None when no plausible plate
+    quadrilateral is found.
+    """
+    h, w = gray.shape[:2]
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, None)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+
+    contour = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(contour) < RECTIFY_MIN_AREA * h * w:
+        return None
+
+    approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+    if len(approx) == 4:
+        corners = order_corners(approx)
+    else:
+        corners = order_corners(cv2.boxPoints(cv2.minAreaRect(contour)))
+
+    tl, tr, br, bl = corners
+    out_w = int(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl)))
+    out_h = int(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr)))
+    if out_w < 8 or out_h < 8 or out_h > out_w:
+        return None
+
+    target = np.array([[0, 0], [out_w - 1, 0], [out_w - 1, out_h - 1], [0, out_h - 1]],
+                      dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(gray, matrix, (out_w, out_h))
+
+def enhance_plates(crops, adaptive=True, box_sizes=None):
+    """Rectify, enhance and resize a batch of plate crops for OCR.
+
+    Each crop gets the enhancement chosen by assess_plate_quality, judged
+    on its unpadded (width, height) from box_sizes when given; hopeless
+    crops come back as None so OCR can be skipped for them. Returns
+    (enhanced, decisions, rectified), where rectified marks single-line
+    plates that were deskewed and can use the recognition-only OCR path.
+    With adaptive=False crops are only converted and resized.
+
+    Crops are written into a per-thread preallocated buffer and returned as
+    views into it, so results must be consumed before the same thread
+    enhances the next batch.
+    """
+    if not crops:
+        return [], [], []
+
+    grays = []
+    decisions = []
+    rectified = []
+    for i, crop in enumerate(crops):
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        if not adaptive:
+            decisions.append("none")
+            rectified.append(False)
+            grays.append(gray)
+            continue
+
+        decision, metrics = assess_plate_quality(gray, box_sizes[i] if box_sizes else None)
+        decisions.append(decision)
+        print(f"🔍 Quality {crop.shape[:2]}: {decision} "
+              f"(contrast={metrics['contrast']:.1f}, sharpness={metrics['sharpness']:.1f}, "
+              f"brightness={metrics['brightness']:.1f})")
+
+        if decision == "skip":
+            grays.append(None)
+            rectified.append(False)
+            continue
+
+        plate = rectify_plate(gray)
+        single_line = plate is not None and plate.shape[1] >= RECTIFY_MIN_ASPECT * plate.shape[0]
+        if single_line:
+            gray = plate
+        rectified.append(single_line)
+
+        if decision == "clahe":
+            gray = get_clahe().apply(gray)
+        elif decision == "sharpen":
+            gray = sharpen_plate(gray)
+        grays.append(gray)
+
+    sizes = [ocr_input_size(*gray.shape[:2]) if gray is not None else (0, 0) for gray in grays]
+    max_w = max(w for w, _ in sizes)
+    max_h = max(h for _, h in sizes)
+    channels = 1 if OCR_GRAYSCALE_INPUT else 3
+    batch = get_batch_buffer(len(crops), max_h, max_w, channels)
+
+    enhanced = []
+    for i, (gray, (new_w, new_h)) in enumerate(zip(grays, sizes)):
+        if gray is None:
+            enhanced.append(None)
+            continue
+        slot = batch[i, :new_h, :new_w]
+        if channels == 1:
+            cv2.resize(gray, (new_w, new_h), dst=slot)
+        else:
+            cv2.cvtColor(cv2.resize(gray, (new_w, new_h)), cv2.COLOR_GRAY2BGR, dst=slot)
+        enhanced.append(slot)
+    return enhanced, decisions, rectified
+
+def apply_roi(image, source):
+    """Crop frame to the ROI bounding rect of a source.
+
+    Returns (frame, (offset_x, offset_y), polygon); polygon is None when the
+    source has no ROI configured.
+    """
+    points = roi_polygons.get(source) if source else None
+    if not points:
+        return image, (0, 0), None
+
+    polygon = np.array(points, dtype=np.int32)
+    h, w = image.shape[:2]
+    rx, ry, rw, rh = cv2.boundingRect(polygon)
+    rx1, ry1 = max(0, rx), max(0, ry)
+    rx2, ry2 = min(w, rx + rw), min(h, ry + rh)
+    if rx2 <= rx1 or ry2 <= ry1:
+        return image, (0, 0), polygon
+
+    return image[ry1:ry2, rx1:rx2], (rx1, ry1), polygon
+
+def box_in_roi(polygon, x1, y1, x2, y2):
+    """Check whether a box centre lies inside the ROI polygon"""
+    if polygon is None:
+        return True
+    center = ((x1 + x2) / 2.0, (y1 + y2) / 2.0)
+    return cv2.pointPolygonTest(polygon, center, False) >= 0
+
 def clean_text(text):
     """Clean OCR output"""
     if not text:
@@ -81,122 +438,1143 @@ def parse_paddleocr_result(ocr_results):
     # Legacy format
     elif isinstance(result, list):
         for line in result:
-            if isinstance(line, list) and len(line) >= 2:
+            # Recognition-only output is a bare (text, score) pair
+            if isinstance(line, (list, tuple)) and len(line) == 2 and isinstance(line[0], str):
+                texts.append((line[0], line[1]))
+            elif isinstance(line, list) and len(line) >= 2:
                 if isinstance(line[1], (list, tuple)) and len(line[1]) >= 2:
                     text, conf = line[1][0], line[1][1]
                     texts.append((text, conf))
     
     return texts
 
-@app.post("/detect/")
-async def detect_license_plates(file: UploadFile = File(...)):
+# Detection and OCR gating; gated boxes are still reported as detections.
+# Defaults OCR every detected box; raise them to shed OCR work.
+YOLO_CONFIDENCE = float(os.environ.get("YOLO_CONFIDENCE", "0.1"))
+OCR_MIN_CONFIDENCE = float(os.environ.get("OCR_MIN_CONFIDENCE", "0.1"))
+OCR_MIN_BOX_WIDTH = int(os.environ.get("OCR_MIN_BOX_WIDTH", "0"))
+OCR_MIN_BOX_HEIGHT = int(os.environ.get("OCR_MIN_BOX_HEIGHT", "0"))
+OCR_MAX_PLATES = int(os.environ.get("OCR_MAX_PLATES", "0"))
+
+def select_ocr_boxes(boxes, max_plates=OCR_MAX_PLATES):
+    """Return indices of boxes worth OCR, highest YOLO confidence first"""
+    ranked = sorted(range(len(boxes)), key=lambda i: boxes[i][1], reverse=True)
+    selected = []
+    for i in ranked:
+        (x1, y1, x2, y2), yolo_conf = boxes[i]
+        if yolo_conf < OCR_MIN_CONFIDENCE:
+            continue
+        if x2 - x1 < OCR_MIN_BOX_WIDTH or y2 - y1 < OCR_MIN_BOX_HEIGHT:
+            continue
+        if max_plates > 0 and len(selected) >= max_plates:
+            break
+        selected.append(i)
+    return selected
+
+# Latency budgets: per-request deadlines degrade the pipeline step by step
+DEADLINE_FAST_DETECT_BELOW_MS = float(os.environ.get("DEADLINE_FAST_DETECT_BELOW_MS", "500"))
+DEADLINE_FAST_IMGSZ = int(os.environ.get("DEADLINE_FAST_IMGSZ", "320"))
+DEADLINE_MARGIN_MS = float(os.environ.get("DEADLINE_MARGIN_MS", "20"))
+
+# Running per-stage cost estimates (ms), updated from observed timings
+stage_estimates_ms = {"enhance": 5.0, "ocr": 150.0, "request": 500.0}
+
+def record_stage_time(stage, elapsed_ms, alpha=0.2):
+    """Fold an observed stage duration into its moving average"""
+    stage_estimates_ms[stage] = (1 - alpha) * stage_estimates_ms[stage] + alpha * elapsed_ms
+
+def remaining_ms(deadline):
+    """Milliseconds left before a monotonic deadline (inf when unset)"""
+    if deadline is None:
+        return float("inf")
+    return (deadline - time.monotonic()) * 1000.0
+
+def parse_paddleocr_regions(ocr_results):
+    """Extract (text, confidence, polygon) fragments from det+rec results"""
+    fragments = []
+    
+    if not ocr_results:
+        return fragments
+    
+    result = ocr_results[0]
+    
+    if isinstance(result, dict) and 'rec_texts' in result:
+        rec_texts = result.get('rec_texts', [])
+        rec_scores = result.get('rec_scores', [])
+        # rec_polys align with rec_texts; dt_polys only when nothing was filtered
+        polys = result.get('rec_polys')
+        if polys is None or len(polys) != len(rec_texts):
+            polys = result.get('dt_polys', [])
+        if len(polys) != len(rec_texts):
+            return fragments
+        
+        for text, score, poly in zip(rec_texts, rec_scores, polys):
+            if text and text.strip():
+                fragments.append((text, score, poly))
+    
+    elif isinstance(result, list):
+        for line in result:
+            if (isinstance(line, list) and len(line) >= 2 and not isinstance(line[0], str)
+                    and isinstance(line[1], (list, tuple)) and len(line[1]) >= 2):
+                fragments.append((line[1][0], line[1][1], line[0]))
+    
+    return fragments
+
+# Fragments shorter than this fraction of the tallest are treated as
+# surrounding text (state names, dealer frames) rather than plate rows
+MULTILINE_MIN_HEIGHT_RATIO = float(os.environ.get("MULTILINE_MIN_HEIGHT_RATIO", "0.5"))
+
+def assemble_plate_lines(fragments):
+    """Merge multi-row plate fragments into one (text, confidence).
+
+    Fragments are grouped into rows by vertical centre, rows are read top
+    to bottom and fragments left to right. Returns None unless at least two
+    fragments survive the height filter.
+    """
+    boxes = []
+    for text, conf, poly in fragments:
+        points = np.asarray(poly, dtype=np.float32).reshape(-1, 2)
+        y_min, y_max = float(points[:, 1].min()), float(points[:, 1].max())
+        boxes.append((text, float(conf), float(points[:, 0].min()), (y_min + y_max) / 2, y_max - y_min))
+    
+    if len(boxes) < 2:
+        return None
+    tallest = max(b[4] for b in boxes)
+    boxes = [b for b in boxes if b[4] >= MULTILINE_MIN_HEIGHT_RATIO * tallest]
+    if len(boxes) < 2:
+        return None
+    
+    boxes.sort(key=lambda b: b[3])
+    rows = [[boxes[0]]]
+    for b in boxes[1:]:
+        row = rows[-1]
+        row_center = sum(r[3] for r in row) / len(row)
+        if abs(b[3] - row_center) > 0.5 * min(b[4], row[0][4]):
+            rows.append([b])
+        else:
+            row.append(b)
+    
+    ordered = [b for row in rows for b in sorted(row, key=lambda b: b[2])]
+    text = " ".join(b[0].strip() for b in ordered)
+    # Weight confidence by text length so short fragments count less
+    weights = [max(1, len(b[0].strip())) for b in ordered]
+    conf = sum(b[1] * w for b, w in zip(ordered, weights)) / sum(weights)
+    return text, conf
+
+def add_timing(timings, stage, started):
+    """Accumulate ms since a perf_counter() start into an optional dict"""
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - started) * 1000.0
+
+def crop_plate(image, x1, y1, x2, y2, pad=20):
+    """Crop a plate box from the full frame with padding"""
+    h, w = image.shape[:2]
+    x1_p = max(0, x1 - pad)
+    y1_p = max(0, y1 - pad)
+    x2_p = min(w, x2 + pad)
+    y2_p = min(h, y2 + pad)
+    return image[y1_p:y2_p, x1_p:x2_p]
+
+def run_ocr(enhanced, rec_only=False):
+    """Run PaddleOCR, using the recognition-only path for rectified plates"""
+    if rec_only:
+        try:
+            return ocr.ocr(enhanced, det=False, cls=False)
+        except TypeError as e:
+            # OCR engines without det/cls switches only run the full pipeline
+            print(f"⚠️ Recognition-only OCR unavailable: {e}")
+    
+    # PaddleOCR with predict method
+    return ocr.ocr(enhanced)
+
+# Top-K alternatives decoded from the recognizer's CTC output
+OCR_TOP_K = int(os.environ.get("OCR_TOP_K", "5"))
+CTC_PRUNE_PROB = 1e-3
+
+def ctc_greedy_decode(probs, characters):
+    """Greedy CTC decode returning (text, score, [(char, prob), ...]).
+
+    score is the mean per-character probability, as PaddleOCR reports it.
+    """
+    best = probs.argmax(axis=1)
+    chars = []
+    previous = 0
+    for t, c in enumerate(best):
+        if c != 0 and c != previous:
+            chars.append([characters[c], float(probs[t, c])])
+        elif c != 0 and chars:
+            # Repeated frames of the same character keep its best probability
+            chars[-1][1] = max(chars[-1][1], float(probs[t, c]))
+        previous = c
+    text = "".join(ch for ch, _ in chars)
+    score = float(np.mean([p for _, p in chars])) if chars else 0.0
+    return text, score, [(ch, round(p, 3)) for ch, p in chars]
+
+def ctc_beam_search(probs, characters, beam_width=5):
+    """CTC prefix beam search returning [(text, probability), ...] best first"""
+    # prefix -> [p ending in blank, p ending in non-blank]
+    beams = {(): [1.0, 0.0]}
+    for step in probs:
+        candidates = np.nonzero(step > CTC_PRUNE_PROB)[0]
+        next_beams = defaultdict(lambda: [0.0, 0.0])
+        for prefix, (p_blank, p_char) in beams.items():
+            total = p_blank + p_char
+            for c in candidates:
+                p = float(step[c])
+                if c == 0:
+                    next_beams[prefix][0] += total * p
+                    continue
+                extended = prefix + (c,)
+                if prefix and prefix[-1] == c:
+                    # A repeat only extends the prefix across a blank
+                    next_beams[extended][1] += p_blank * p
+                    next_beams[prefix][1] += p_char * p
+                else:
+                    next_beams[extended][1] += total * p
+        ranked = sorted(next_beams.items(), key=lambda item: -sum(item[1]))
+        beams = dict(ranked[:beam_width])
+    return [("".join(characters[c] for c in prefix), sum(p)) for prefix, p in
+            sorted(beams.items(), key=lambda item: -sum(item[1]))]
+
+def recognize_plate(enhanced):
+    """Run PaddleOCR's recognizer directly to get its CTC probabilities.
+
+    Returns (candidates, details) where candidates are (text, confidence)
+    pairs best first and details holds per-character confidences and
+    top-K alternatives, or None when the recognizer internals are not
+    reachable or fail (other engines/versions).
+    """
+    recognizer = getattr(ocr, "text_recognizer", None)
+    if recognizer is None or not hasattr(recognizer, "predictor"):
+        return None
+    
     try:
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        image = enhanced if enhanced.ndim == 3 else cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
+        _, img_h, img_w = recognizer.rec_image_shape[:3]
+        max_wh_ratio = max(img_w / img_h, image.shape[1] / float(image.shape[0]))
+        batch = recognizer.resize_norm_img(image, max_wh_ratio)[np.newaxis, :].copy()
+        recognizer.input_tensor.copy_from_cpu(batch)
+        recognizer.predictor.run()
+        probs = recognizer.output_tensors[0].copy_to_cpu()[0]
+        characters = recognizer.postprocess_op.character
+    except Exception as e:
+        # These are PaddleOCR internals; any mismatch falls back to run_ocr
+        print(f"⚠️ Direct recognizer call failed: {e}")
+        return None
+    
+    text, score, char_confidences = ctc_greedy_decode(probs, characters)
+    beams = ctc_beam_search(probs, characters, max(1, OCR_TOP_K))
+    # Alternatives share the greedy score scale, weighted by beam probability
+    top_prob = beams[0][1] if beams and beams[0][1] > 0 else 1.0
+    candidates = [(text, score)] + [(alt, score * prob / top_prob) for alt, prob in beams if alt != text]
+    details = {
+        "char_confidences": char_confidences,
+        "alternatives": [{"text": alt, "probability": round(prob, 4)} for alt, prob in beams],
+    }
+    return candidates, details
+
+def match_char_confidences(details, text):
+    """Drop per-character confidences that describe a different read than text"""
+    chars = details.get("char_confidences")
+    if chars is not None and clean_text("".join(ch for ch, _ in chars)) != text:
+        del details["char_confidences"]
+
+def read_plate_text(enhanced, rec_only=False, region=None):
+    """Run OCR on an enhanced crop and return (text, confidence, details).
+
+    Recognition-only reads also decode CTC alternatives, which become extra
+    candidates and are reported in details. With a region, candidates are
+    corrected and ranked by its plate syntax and reads that fit no template
+    are rejected. Per-character confidences are only kept when they
+    describe the selected read.
+    """
+    print(f"Running OCR on image: {enhanced.shape}{' (rec only)' if rec_only else ''}")
+    
+    recognized = recognize_plate(enhanced) if rec_only and OCR_TOP_K > 0 else None
+    if recognized is not None:
+        texts, details = recognized
+    else:
+        ocr_results = run_ocr(enhanced, rec_only)
+        print(f"Raw OCR results type: {type(ocr_results)}")
         
-        if image is None:
-            return {"error": "Invalid image", "results": []}
+        # Parse results using new method
+        texts = parse_paddleocr_result(ocr_results)
+        details = {}
         
+        # Two-row plates come back as separate lines; read them as one plate
+        assembled = assemble_plate_lines(parse_paddleocr_regions(ocr_results))
+        if assembled is not None:
+            print(f"🧩 Assembled {assembled[0]!r} from multiple lines")
+            texts = [assembled] + texts
+            details["lines_assembled"] = True
+    
+    print(f"Parsed texts: {texts}")
+    
+    if region is not None:
+        cleaned = [(clean_text(text), conf) for text, conf in texts]
+        best = plate_formats.select([(text, conf) for text, conf in cleaned if text], region)
+        if best is None:
+            print(f"📝 OCR: No read fits {region} plate formats")
+            return "INVALID_FORMAT", 0.0, details
+        print(f"📝 OCR Success: '{best[0]}' (confidence: {best[1]:.3f}, region: {region})")
+        match_char_confidences(details, best[0])
+        return best[0], best[1], details
+    
+    # Find best text, preferring a full multi-line assembly over its fragments
+    best_text = ""
+    best_conf = 0
+    if details.get("lines_assembled"):
+        texts = texts[:1]
+    
+    for text, conf in texts:
+        cleaned = clean_text(text)
+        if cleaned and conf > best_conf:
+            best_text = cleaned
+            best_conf = conf
+    
+    if best_text:
+        print(f"📝 OCR Success: '{best_text}' (confidence: {best_conf:.3f})")
+        match_char_confidences(details, best_text)
+        return best_text, best_conf, details
+    
+    print("📝 OCR: No readable text found")
+    return "NO_READABLE_TEXT", 0.0, details
+
+def detect_image(image, source=None, deadline=None, timings=None, yolo_results=None):
+    """Run YOLO + OCR on a decoded BGR frame and return detections.
+
+    deadline is a time.monotonic() timestamp; when set, the detector input
+    size, enhancement and number of OCRed plates shrink to fit the budget
+    and plates left unread are returned with text PENDING. If timings is a
+    dict, per-stage durations in ms are accumulated into it. yolo_results
+    are YOLO results already computed for the ROI-cropped frame (see
+    detect_images).
+    """
+    attributes = {"image.width": image.shape[1], "image.height": image.shape[0], "source": source or ""}
+    with tracer.span("detect", **attributes) as detect_span:
         print(f"📷 Processing: {image.shape}")
-        
-        # YOLO detection
-        results = yolo_model(image, conf=0.1, verbose=False)
-        detections = []
-        
+        stage_started = time.perf_counter()
+    
+        # Restrict YOLO to the source's region of interest
+        frame, (off_x, off_y), roi_polygon = apply_roi(image, source)
+        region = plate_formats.region_for(source)
+        if roi_polygon is not None:
+            print(f"🔲 ROI '{source}': {frame.shape}")
+    
+        # YOLO detection, at reduced input size when the budget is tight
+        yolo_kwargs = {}
+        if remaining_ms(deadline) < DEADLINE_FAST_DETECT_BELOW_MS:
+            yolo_kwargs["imgsz"] = DEADLINE_FAST_IMGSZ
+            print(f"⏱️ Tight budget: YOLO imgsz={DEADLINE_FAST_IMGSZ}")
+        add_timing(timings, "roi", stage_started)
+        stage_started = time.perf_counter()
+        with tracer.span("yolo", **{"yolo.input_width": frame.shape[1], "yolo.input_height": frame.shape[0]}):
+            if yolo_results is None:
+                yolo_results = yolo_model(frame, conf=YOLO_CONFIDENCE, verbose=False, **yolo_kwargs)
+            results = yolo_results
+        boxes = []
+    
         for result in results:
             if result.boxes is None:
                 continue
-                
-            print(f"🎯 YOLO detected {len(result.boxes)} license plate(s)")
             
+            print(f"🎯 YOLO detected {len(result.boxes)} license plate(s)")
+        
             for i, box in enumerate(result.boxes):
                 try:
                     x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
+                    x1, y1, x2, y2 = x1 + off_x, y1 + off_y, x2 + off_x, y2 + off_y
                     yolo_conf = float(box.conf[0].cpu().numpy())
-                    
-                    plate_text = "LICENSE_PLATE"
-                    ocr_conf = 0.0
-                    
-                    if ocr is not None:
-                        try:
-                            # Crop with padding
-                            h, w = image.shape[:2]
-                            pad = 20
-                            x1_p = max(0, x1 - pad)
-                            y1_p = max(0, y1 - pad)
-                            x2_p = min(w, x2 + pad)
-                            y2_p = min(h, y2 + pad)
-                            
-                            crop = image[y1_p:y2_p, x1_p:x2_p]
-                            
-                            if crop.size > 0:
-                                enhanced = enhance_plate(crop)
-                                
-                                # Resize for better OCR
-                                h_crop, w_crop = enhanced.shape[:2]
-                                if h_crop < 40 or w_crop < 120:
-                                    scale = max(40/h_crop, 120/w_crop, 1.5)
-                                    new_h = int(h_crop * scale)
-                                    new_w = int(w_crop * scale)
-                                    enhanced = cv2.resize(enhanced, (new_w, new_h))
-                                
-                                print(f"Running OCR on image: {enhanced.shape}")
-                                
-                                # PaddleOCR with predict method
-                                ocr_results = ocr.ocr(enhanced)
-                                print(f"Raw OCR results type: {type(ocr_results)}")
-                                
-                                # Parse results using new method
-                                texts = parse_paddleocr_result(ocr_results)
-                                
-                                print(f"Parsed texts: {texts}")
-                                
-                                # Find best text
-                                best_text = ""
-                                best_conf = 0
-                                
-                                for text, conf in texts:
-                                    cleaned = clean_text(text)
-                                    if cleaned and conf > best_conf:
-                                        best_text = cleaned
-                                        best_conf = conf
-                                
-                                if best_text:
-                                    plate_text = best_text
-                                    ocr_conf = best_conf
-                                    print(f"📝 OCR Success: '{best_text}' (confidence: {best_conf:.3f})")
-                                else:
-                                    print("📝 OCR: No readable text found")
-                                    plate_text = "NO_READABLE_TEXT"
-                                
-                        except Exception as ocr_error:
-                            print(f"❌ OCR error: {ocr_error}")
-                            plate_text = "OCR_ERROR"
-                    else:
-                        plate_text = "NO_OCR_ENGINE"
-                    
-                    detections.append({
-                        "box": [x1, y1, x2, y2],
-                        "text": plate_text,
-                        "yolo_confidence": round(yolo_conf, 3),
-                        "ocr_confidence": round(ocr_conf, 3)
-                    })
-                    
-                    print(f"✅ Detection added: '{plate_text}' YOLO:{yolo_conf:.3f} OCR:{ocr_conf:.3f}")
-                    
+                
+                    if not box_in_roi(roi_polygon, x1, y1, x2, y2):
+                        continue
+                
+                    boxes.append(([x1, y1, x2, y2], yolo_conf))
                 except Exception as e:
                     print(f"❌ Error processing box {i}: {e}")
                     continue
+    
+        add_timing(timings, "yolo", stage_started)
+    
+        # Spend the OCR budget on the most plausible plates first
+        selected = select_ocr_boxes(boxes) if ocr is not None else []
+        if len(selected) < len(boxes):
+            print(f"🚦 OCR gated to {len(selected)} of {len(boxes)} box(es)")
+    
+        # Cap OCR to what the remaining budget affords, dropping enhancement first
+        budget_ms = remaining_ms(deadline) - DEADLINE_MARGIN_MS
+        adaptive = True
+        pending = set()
+        if budget_ms < len(selected) * (stage_estimates_ms["ocr"] + stage_estimates_ms["enhance"]):
+            adaptive = False
+            affordable = max(0, int(budget_ms // stage_estimates_ms["ocr"]))
+            pending = set(selected[affordable:])
+            selected = selected[:affordable]
+            print(f"⏱️ Budget {budget_ms:.0f}ms: OCR on {len(selected)}, {len(pending)} pending")
+    
+        # Crop and enhance the selected plates in one batch before OCR
+        with tracer.span("plates.crop", **{"plate.count": len(selected)}):
+            crops = {i: crop_plate(image, *boxes[i][0]) for i in selected}
+        ocr_slots = [i for i in selected if crops[i].size > 0]
+        enhanced = {}
+        decisions = {}
+        rectified = {}
+        if ocr is not None and ocr_slots:
+            try:
+                started = time.perf_counter()
+                with tracer.span("plates.enhance", **{"plate.count": len(ocr_slots), "adaptive": adaptive}):
+                    box_sizes = [(boxes[i][0][2] - boxes[i][0][0], boxes[i][0][3] - boxes[i][0][1])
+                                 for i in ocr_slots]
+                    batch, batch_decisions, batch_rectified = enhance_plates(
+                        [crops[i] for i in ocr_slots], adaptive=adaptive, box_sizes=box_sizes)
+                add_timing(timings, "enhance", started)
+                if adaptive:
+                    record_stage_time("enhance", (time.perf_counter() - started) * 1000.0 / len(ocr_slots))
+                enhanced = dict(zip(ocr_slots, batch))
+                decisions = dict(zip(ocr_slots, batch_decisions))
+                rectified = dict(zip(ocr_slots, batch_rectified))
+            except Exception as e:
+                print(f"❌ Enhancement error: {e}")
+                enhanced = dict.fromkeys(ocr_slots)
+    
+        detections = []
+        for i, (box, yolo_conf) in enumerate(boxes):
+            plate_text = "LICENSE_PLATE"
+            ocr_conf = 0.0
+            details = {}
         
+            if ocr is None:
+                plate_text = "NO_OCR_ENGINE"
+            elif i in pending:
+                plate_text = "PENDING"
+            elif i not in crops:
+                plate_text = "OCR_SKIPPED"
+            elif decisions.get(i) == "skip":
+                plate_text = "LOW_QUALITY"
+            elif remaining_ms(deadline) - DEADLINE_MARGIN_MS < stage_estimates_ms["ocr"]:
+                plate_text = "PENDING"
+            elif i in enhanced:
+                try:
+                    if enhanced[i] is None:
+                        raise RuntimeError("plate enhancement failed")
+                    rec_only = OCR_REC_ONLY_RECTIFIED and rectified.get(i, False)
+                    started = time.perf_counter()
+                    with tracer.span("plate.ocr", **{"plate.index": i, "plate.box": str(box), "rec_only": rec_only}) as ocr_span:
+                        plate_text, ocr_conf, details = read_plate_text(enhanced[i], rec_only, region)
+                        ocr_span.set("plate.text", plate_text)
+                        ocr_span.set("ocr.confidence", float(ocr_conf))
+                    add_timing(timings, "ocr", started)
+                    record_stage_time("ocr", (time.perf_counter() - started) * 1000.0)
+                except Exception as ocr_error:
+                    print(f"❌ OCR error: {ocr_error}")
+                    plate_text = "OCR_ERROR"
+        
+            detections.append({
+                "box": box,
+                "text": plate_text,
+                "yolo_confidence": round(yolo_conf, 3),
+                "ocr_confidence": round(ocr_conf, 3),
+                **details
+            })
+        
+            print(f"✅ Detection added: '{plate_text}' YOLO:{yolo_conf:.3f} OCR:{ocr_conf:.3f}")
+    
+        stage_started = time.perf_counter()
+        watchlists.check(detections, source)
+        if event_store is not None:
+            event_store.record(detections, source)
+        add_timing(timings, "postprocess", stage_started)
+    
         print(f"🎉 Returning {len(detections)} total detections")
-        return {"results": detections}
+        detect_span.set("plate.count", len(detections))
+    return detections
+
+def detect_images(images, source=None):
+    """detect_image over a batch of frames with a single YOLO call"""
+    frames = [apply_roi(image, source)[0] for image in images]
+    with tracer.span("yolo.batch", **{"batch.size": len(frames)}):
+        batch = yolo_model(frames, conf=YOLO_CONFIDENCE, verbose=False) if frames else []
+    return [detect_image(image, source, yolo_results=[result]) for image, result in zip(images, batch)]
+
+# Models are not thread-safe, so inference is serialized on a dedicated pool
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+
+# Priority classes, highest first; waiting longer than
+# PRIORITY_STARVATION_SECONDS lets lower classes jump the queue
+PRIORITY_CLASSES = ("live", "normal", "batch")
+PRIORITY_STARVATION_SECONDS = float(os.environ.get("PRIORITY_STARVATION_SECONDS", "2"))
+
+class PriorityInferencePool:
+    """Worker threads serving per-priority FIFO queues.
+
+    The highest non-empty class is served first, except that the oldest
+    task waiting longer than starvation_seconds in any class goes next.
+    """
+    def __init__(self, workers, starvation_seconds):
+        self.starvation_seconds = starvation_seconds
+        self.queues = {name: deque() for name in PRIORITY_CLASSES}
+        self.served = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self.condition = threading.Condition()
+        for n in range(workers):
+            threading.Thread(target=self._worker, name=f"inference-{n}", daemon=True).start()
+
+    def submit(self, priority, fn, *args):
+        """Queue fn(*args) under a priority class and return its Future.
+
+        fn runs in a copy of the caller's context, so the open trace span
+        carries over to the worker thread.
+        """
+        if priority not in self.queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        future = Future()
+        context = contextvars.copy_context()
+        with self.condition:
+            self.queues[priority].append((time.monotonic(), future, context, fn, args))
+            self.condition.notify()
+        return future
+
+    def depths(self):
+        """Number of queued (not yet running) tasks per class"""
+        with self.condition:
+            return {name: len(q) for name, q in self.queues.items()}
+
+    def _next_task(self):
+        now = time.monotonic()
+        starved = [name for name, q in self.queues.items()
+                   if q and now - q[0][0] > self.starvation_seconds]
+        if starved:
+            name = min(starved, key=lambda n: self.queues[n][0][0])
+        else:
+            name = next(n for n in PRIORITY_CLASSES if self.queues[n])
+        self.served[name] += 1
+        return self.queues[name].popleft()
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not any(self.queues.values()):
+                    self.condition.wait()
+                _, future, context, fn, args = self._next_task()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(fn, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+inference_pool = PriorityInferencePool(INFERENCE_WORKERS, PRIORITY_STARVATION_SECONDS)
+
+# Admission control: bounded in-flight work with fast 429/503 rejection.
+# Lower classes are only admitted below their own watermark of the shared
+# depth, so batch and normal traffic cannot take the slots kept for live.
+MAX_QUEUE_DEPTH = int(os.environ.get("MAX_QUEUE_DEPTH", "32"))
+QUEUE_DEPTH_LIMITS = {
+    "live": MAX_QUEUE_DEPTH,
+    "normal": int(os.environ.get("QUEUE_DEPTH_NORMAL", str(MAX_QUEUE_DEPTH * 3 // 4))),
+    "batch": int(os.environ.get("QUEUE_DEPTH_BATCH", str(MAX_QUEUE_DEPTH // 2))),
+}
+QUEUE_WAIT_TIMEOUT = float(os.environ.get("QUEUE_WAIT_TIMEOUT", "5"))
+QUEUE_WAIT_TIMEOUTS = {
+    "live": QUEUE_WAIT_TIMEOUT,
+    "normal": float(os.environ.get("QUEUE_WAIT_TIMEOUT_NORMAL", str(QUEUE_WAIT_TIMEOUT))),
+    "batch": float(os.environ.get("QUEUE_WAIT_TIMEOUT_BATCH", "60")),
+}
+queue_stats = {
+    "depth": 0,
+    "peak_depth": 0,
+    "admitted": 0,
+    "rejected_full": 0,
+    "rejected_timeout": 0,
+    "depth_by_priority": dict.fromkeys(PRIORITY_CLASSES, 0),
+}
+
+class InferenceRejected(Exception):
+    """Raised when a request is refused by admission control"""
+    def __init__(self, status_code, reason):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after_seconds()
+
+def retry_after_seconds():
+    """Estimate how long the current queue takes to drain"""
+    drain_ms = queue_stats["depth"] * stage_estimates_ms["request"] / INFERENCE_WORKERS
+    return max(1, math.ceil(drain_ms / 1000.0))
+
+def rejection_response(rejected):
+    """Build the HTTP response for a rejected request"""
+    return JSONResponse(
+        status_code=rejected.status_code,
+        content={"error": rejected.reason, "results": []},
+        headers={"Retry-After": str(rejected.retry_after)},
+    )
+
+@contextlib.contextmanager
+def inference_slot(priority="normal"):
+    """Hold one slot of the inference queue, rejecting when the queue is
+    past this priority's watermark.
+
+    Only touched from the event loop, so the counters need no lock.
+    """
+    if queue_stats["depth"] >= QUEUE_DEPTH_LIMITS[priority]:
+        queue_stats["rejected_full"] += 1
+        raise InferenceRejected(429, "Inference queue full")
+    queue_stats["depth"] += 1
+    queue_stats["depth_by_priority"][priority] += 1
+    queue_stats["admitted"] += 1
+    queue_stats["peak_depth"] = max(queue_stats["peak_depth"], queue_stats["depth"])
+    try:
+        yield
+    finally:
+        queue_stats["depth"] -= 1
+        queue_stats["depth_by_priority"][priority] -= 1
+
+# Admin endpoints and per-request profiling need X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "./profiles")
+PROFILE_MAX_SECONDS = 60
+profile_lock = threading.Lock()
+# cProfile hooks are process-wide on Python 3.12+, so one X-Profile capture at a time
+request_profile_lock = threading.Lock()
+
+def is_admin(token):
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token or "", ADMIN_TOKEN)
+
+def admin_forbidden():
+    return JSONResponse(status_code=403, content={"error": "Admin token required"})
+
+def timed_detect(enqueued_at, wait_timeout, image, source, deadline, profile_path=None):
+    """Worker-side detect_image that drops requests which waited too long.
+
+    run_inference cancels tasks still queued after wait_timeout; this
+    check is a backstop for ones dequeued in the same instant.
+    """
+    waited_ms = (time.monotonic() - enqueued_at) * 1000.0
+    if waited_ms > wait_timeout * 1000.0:
+        return None
+    started = time.perf_counter()
+    with tracer.span("inference", **{"queue.wait_ms": round(waited_ms, 3)}):
+        if profile_path:
+            detections = profile_call(profile_path, detect_image, image, source, deadline)
+        else:
+            detections = detect_image(image, source, deadline)
+    record_stage_time("request", (time.perf_counter() - started) * 1000.0)
+    return detections
+
+async def run_inference(image, source=None, deadline=None, priority="normal", profile_path=None):
+    """Run detect_image on the inference pool without blocking the event loop.
+
+    Callers must hold an inference_slot(). With profile_path the call runs
+    under cProfile and its stats are written there.
+    """
+    wait_timeout = QUEUE_WAIT_TIMEOUTS[priority]
+    future = inference_pool.submit(
+        priority, timed_detect, time.monotonic(), wait_timeout, image, source, deadline, profile_path)
+    waiter = asyncio.wrap_future(future)
+    # Bound the time spent queued; once a worker has started, wait it out
+    done, _ = await asyncio.wait({waiter}, timeout=wait_timeout)
+    if not done and future.cancel():
+        queue_stats["rejected_timeout"] += 1
+        raise InferenceRejected(503, "Timed out waiting for inference")
+    detections = await waiter
+    if detections is None:
+        queue_stats["rejected_timeout"] += 1
+        raise InferenceRejected(503, "Timed out waiting for inference")
+    return detections
+
+def read_upload_buffer(fileobj):
+    """Copy an upload into one preallocated uint8 array, chunk by chunk"""
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+    buffer = np.empty(size, np.uint8)
+    filled = 0
+    while filled < size:
+        chunk = fileobj.read(min(UPLOAD_CHUNK_BYTES, size - filled))
+        if not chunk:
+            break
+        buffer[filled:filled + len(chunk)] = np.frombuffer(chunk, np.uint8)
+        filled += len(chunk)
+    return buffer[:filled]
+
+async def read_body_buffer(request, size):
+    """Stream a request body into a preallocated array of exactly size bytes"""
+    buffer = np.empty(size, np.uint8)
+    filled = 0
+    async for chunk in request.stream():
+        if filled + len(chunk) > size:
+            raise ValueError(f"Body is larger than the {size}-byte frame")
+        buffer[filled:filled + len(chunk)] = np.frombuffer(chunk, np.uint8)
+        filled += len(chunk)
+    if filled < size:
+        raise ValueError(f"Expected {size} bytes, got {filled}")
+    return buffer
+
+def negotiated_response(payload, accept, nested=False):
+    """payload as-is (JSON) or MessagePack/CBOR with columnar detections,
+    per the Accept header"""
+    chosen = encoding.negotiate(accept)
+    if chosen == "json":
+        return payload
+    body, media_type = encoding.encode(payload, chosen, nested)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
+
+@app.post("/detect/")
+async def detect_license_plates(
+    file: UploadFile = File(...),
+    source: Optional[str] = None,
+    deadline_ms: Optional[float] = None,
+    x_deadline_ms: Optional[float] = Header(None),
+    priority: Optional[str] = None,
+    x_priority: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+    traceparent: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+):
+    priority = priority or x_priority or "normal"
+    if priority not in PRIORITY_CLASSES:
+        return {"error": f"priority must be one of {', '.join(PRIORITY_CLASSES)}", "results": []}
+    
+    profile_id = None
+    if x_profile == "1":
+        if not is_admin(x_admin_token):
+            return admin_forbidden()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if not request_profile_lock.acquire(blocking=False):
+            return JSONResponse(status_code=409, content={"error": "A profile is already running", "results": []})
+        profile_id = uuid.uuid4().hex
+    
+    # Budget is measured from when the handler starts
+    budget = deadline_ms if deadline_ms is not None else x_deadline_ms
+    deadline = time.monotonic() + budget / 1000.0 if budget is not None else None
+    attributes = {"http.route": "/detect/", "source": source or "", "priority": priority}
+    with tracer.span("POST /detect/", traceparent, **attributes) as request_span:
+        try:
+            with inference_slot(priority):
+                with tracer.span("upload.read") as read_span:
+                    nparr = await asyncio.to_thread(read_upload_buffer, file.file)
+                    read_span.set("upload.bytes", nparr.size)
+                with tracer.span("image.decode") as decode_span:
+                    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                    if image is not None:
+                        decode_span.set("image.width", image.shape[1])
+                        decode_span.set("image.height", image.shape[0])
+                
+                if image is None:
+                    return {"error": "Invalid image", "results": []}
+                
+                profile_path = os.path.join(PROFILE_DIR, f"{profile_id}.prof") if profile_id else None
+                detections = await run_inference(image, source, deadline, priority, profile_path)
+            
+            with tracer.span("response.build"):
+                response = {"results": detections}
+                if deadline is not None:
+                    response["partial"] = any(d["text"] == "PENDING" for d in detections)
+                if profile_id:
+                    response["profile"] = profile_id
+                return negotiated_response(response, accept)
+            
+        except InferenceRejected as rejected:
+            print(f"🚫 Rejected ({rejected.status_code}): {rejected.reason}")
+            request_span.set("http.status_code", rejected.status_code)
+            return rejection_response(rejected)
+        except Exception as e:
+            print(f"❌ Server error: {e}")
+            request_span.set("error", str(e))
+            import traceback
+            traceback.print_exc()
+            return {"error": str(e), "results": []}
+        finally:
+            if profile_id:
+                request_profile_lock.release()
+
+# Pre-decoded frames: raw pixel buffers in the body or in /dev/shm
+RAW_FRAME_CHANNELS = {"bgr": 3, "rgb": 3, "gray": 1, "nv12": 1}
+RAW_FRAME_MAX_PIXELS = int(os.environ.get("RAW_FRAME_MAX_PIXELS", str(8192 * 8192)))
+RAW_SHM_ENABLED = os.environ.get("RAW_SHM_ENABLED", "0") == "1"
+RAW_SHM_DIR = os.environ.get("RAW_SHM_DIR", "/dev/shm")
+SHM_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+def raw_frame_size(fmt, width, height, stride):
+    """Bytes a raw frame occupies; stride is bytes per (luma) row"""
+    rows = height * 3 // 2 if fmt == "nv12" else height
+    return rows * stride
+
+def decode_raw_frame(buffer, fmt, width, height, stride=None):
+    """Turn a raw pixel buffer into the BGR frame detect_image expects.
+
+    bgr frames without row padding are used in place; everything else is
+    one cvtColor (or a copy to drop padding). Raises ValueError on bad
+    geometry.
+    """
+    if fmt not in RAW_FRAME_CHANNELS:
+        raise ValueError(f"format must be one of {', '.join(RAW_FRAME_CHANNELS)}")
+    if width <= 0 or height <= 0 or width * height > RAW_FRAME_MAX_PIXELS:
+        raise ValueError("Invalid frame size")
+    if fmt == "nv12" and (width % 2 or height % 2):
+        raise ValueError("nv12 frames need even width and height")
+    channels = RAW_FRAME_CHANNELS[fmt]
+    stride = stride or width * channels
+    if stride < width * channels:
+        raise ValueError("Stride is smaller than a row")
+    size = raw_frame_size(fmt, width, height, stride)
+    if len(buffer) < size:
+        raise ValueError(f"Expected {size} bytes, got {len(buffer)}")
+
+    rows = np.frombuffer(buffer, np.uint8, count=size).reshape(-1, stride)[:, :width * channels]
+    if fmt == "nv12":
+        return cv2.cvtColor(np.ascontiguousarray(rows), cv2.COLOR_YUV2BGR_NV12)
+    pixels = rows.reshape(height, width, channels) if channels > 1 else rows
+    if fmt == "rgb":
+        return cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+    if fmt == "gray":
+        return cv2.cvtColor(np.ascontiguousarray(pixels), cv2.COLOR_GRAY2BGR)
+    # No-op for unpadded frames; padded ones are copied to drop the padding
+    return np.ascontiguousarray(pixels)
+
+def read_shm_frame(name, offset, size):
+    """Copy size bytes at offset out of a shared-memory segment"""
+    if not SHM_NAME_RE.match(name):
+        raise ValueError("Invalid shared memory name")
+    data = np.fromfile(os.path.join(RAW_SHM_DIR, name), dtype=np.uint8, count=size, offset=offset)
+    if data.size < size:
+        raise ValueError(f"Shared memory segment holds {data.size} bytes past offset, need {size}")
+    return data
+
+@app.post("/detect/raw")
+async def detect_raw_frame(
+    request: Request,
+    x_frame_format: str = Header(...),
+    x_frame_width: int = Header(...),
+    x_frame_height: int = Header(...),
+    x_frame_stride: Optional[int] = Header(None),
+    x_frame_shm: Optional[str] = Header(None),
+    x_frame_offset: int = Header(0),
+    source: Optional[str] = None,
+    deadline_ms: Optional[float] = None,
+    x_deadline_ms: Optional[float] = Header(None),
+    priority: Optional[str] = None,
+    x_priority: Optional[str] = Header(None),
+    traceparent: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+):
+    """Detect plates in an already-decoded frame.
+
+    The body is the raw pixel buffer (X-Frame-Format bgr/rgb/gray/nv12,
+    X-Frame-Width, X-Frame-Height, optional X-Frame-Stride in bytes per
+    row). With RAW_SHM_ENABLED=1, X-Frame-Shm names a segment under
+    RAW_SHM_DIR to read the frame from (at X-Frame-Offset) instead.
+    """
+    priority = priority or x_priority or "normal"
+    if priority not in PRIORITY_CLASSES:
+        return {"error": f"priority must be one of {', '.join(PRIORITY_CLASSES)}", "results": []}
+    fmt = x_frame_format.lower()
+    if x_frame_shm and not RAW_SHM_ENABLED:
+        return {"error": "Shared memory input is disabled", "results": []}
+
+    budget = deadline_ms if deadline_ms is not None else x_deadline_ms
+    deadline = time.monotonic() + budget / 1000.0 if budget is not None else None
+    attributes = {"http.route": "/detect/raw", "source": source or "", "priority": priority,
+                  "frame.format": fmt}
+    with tracer.span("POST /detect/raw", traceparent, **attributes) as request_span:
+        try:
+            with inference_slot(priority):
+                with tracer.span("frame.read") as read_span:
+                    channels = RAW_FRAME_CHANNELS.get(fmt, 1)
+                    stride = x_frame_stride or x_frame_width * channels
+                    size = raw_frame_size(fmt, x_frame_width, x_frame_height, stride)
+                    if size <= 0 or size > MAX_UPLOAD_BYTES:
+                        raise ValueError("Invalid frame size")
+                    if x_frame_shm:
+                        buffer = read_shm_frame(x_frame_shm, x_frame_offset, size)
+                    else:
+                        buffer = await read_body_buffer(request, size)
+                    read_span.set("frame.bytes", len(buffer))
+                with tracer.span("frame.convert"):
+                    image = decode_raw_frame(buffer, fmt, x_frame_width, x_frame_height, x_frame_stride)
+                detections = await run_inference(image, source, deadline, priority)
+
+            response = {"results": detections}
+            if deadline is not None:
+                response["partial"] = any(d["text"] == "PENDING" for d in detections)
+            return negotiated_response(response, accept)
+
+        except InferenceRejected as rejected:
+            print(f"🚫 Rejected ({rejected.status_code}): {rejected.reason}")
+            request_span.set("http.status_code", rejected.status_code)
+            return rejection_response(rejected)
+        except HTTPException:
+            raise
+        except (ValueError, OSError) as e:
+            print(f"⚠️ Bad raw frame: {e}")
+            return {"error": str(e), "results": []}
+        except Exception as e:
+            print(f"❌ Server error: {e}")
+            request_span.set("error", str(e))
+            import traceback
+            traceback.print_exc()
+            return {"error": str(e), "results": []}
+
+# Asynchronous jobs for batches and video: {job_id: job}
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", "3600"))
+JOB_WEBHOOK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+jobs = {}
+jobs_lock = threading.Lock()
+job_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+
+def prune_jobs():
+    """Forget finished jobs older than JOB_TTL_SECONDS"""
+    cutoff = time.time() - JOB_TTL_SECONDS
+    with jobs_lock:
+        for job_id in [j for j, job in jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+            del jobs[job_id]
+
+def iter_video_frames(path, frame_step):
+    """Decode every frame_step-th frame of a spooled video upload"""
+    capture = cv2.VideoCapture(path)
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if index % frame_step == 0:
+                yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+def spool_upload(fileobj):
+    """Copy an upload to a temp file that outlives the request; returns its path"""
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="job-", suffix=".upload", dir=UPLOAD_SPOOL_DIR,
+                                     delete=False) as tmp:
+        shutil.copyfileobj(fileobj, tmp, UPLOAD_CHUNK_BYTES)
+        return tmp.name
+
+def notify_webhook(url, payload):
+    """POST job results to a local webhook"""
+    try:
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+        print(f"📨 Webhook delivered: {url}")
+    except Exception as e:
+        print(f"❌ Webhook failed ({url}): {e}")
+
+def run_job(job_id, uploads, source, frame_step, callback_url, priority):
+    """Process a job's uploads, one inference per image or sampled frame"""
+    job = jobs[job_id]
+    job["status"] = "running"
+    print(f"🧵 Job {job_id}: {len(uploads)} file(s)")
+    try:
+        for filename, content_type, path in uploads:
+            # Videos stay on disk and are decoded frame by frame
+            if not (content_type or "").startswith("video/"):
+                image = cv2.imdecode(np.fromfile(path, np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    job["results"].append({"filename": filename, "error": "Invalid image", "results": []})
+                    continue
+                detections = inference_pool.submit(priority, detect_image, image, source).result()
+                job["results"].append({"filename": filename, "results": detections})
+                continue
+            
+            for index, frame in iter_video_frames(path, frame_step):
+                detections = inference_pool.submit(priority, detect_image, frame, source).result()
+                job["results"].append({"filename": filename, "frame": index, "results": detections})
         
+        job["status"] = "done"
     except Exception as e:
-        print(f"❌ Server error: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"error": str(e), "results": []}
+        print(f"❌ Job {job_id} failed: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = time.time()
+        for _, _, path in uploads:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+    
+    if callback_url:
+        notify_webhook(callback_url, dict(job, results=list(job["results"])))
+
+@app.post("/jobs")
+async def submit_job(
+    files: List[UploadFile] = File(...),
+    source: Optional[str] = Form(None),
+    frame_step: int = Form(10),
+    callback_url: Optional[str] = Form(None),
+    priority: str = Form("batch"),
+):
+    if priority not in PRIORITY_CLASSES:
+        return {"error": f"priority must be one of {', '.join(PRIORITY_CLASSES)}"}
+    if callback_url:
+        parsed = urlparse(callback_url)
+        if parsed.scheme not in ("http", "https"):
+            return {"error": "callback_url must be an http(s) URL"}
+        if parsed.hostname not in JOB_WEBHOOK_HOSTS:
+            return {"error": "callback_url must point at a local host"}
+    
+    prune_jobs()
+    uploads = []
+    for f in files:
+        path = await asyncio.to_thread(spool_upload, f.file)
+        uploads.append((f.filename, f.content_type, path))
+    job_id = uuid.uuid4().hex
+    with jobs_lock:
+        jobs[job_id] = {
+            "id": job_id,
+            "status": "queued",
+            "created_at": time.time(),
+            "finished_at": None,
+            "error": None,
+            "results": [],
+        }
+    job_pool.submit(run_job, job_id, uploads, source, max(1, frame_step), callback_url, priority)
+    return {"id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, accept: Optional[str] = Header(None)):
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": "Unknown job", "id": job_id}
+    # Snapshot so the worker can keep appending while we serialize
+    return negotiated_response(dict(job, results=list(job["results"])), accept, nested=True)
+
+@app.get("/roi")
+async def list_roi():
+    return {"roi": roi_polygons}
+
+@app.put("/roi/{source}")
+async def set_roi(source: str, points: list = Body(..., embed=True)):
+    if len(points) < 3 or not all(isinstance(p, list) and len(p) == 2 for p in points):
+        return {"error": "ROI needs at least 3 [x, y] points"}
+    try:
+        polygon = [[int(x), int(y)] for x, y in points]
+    except (TypeError, ValueError):
+        return {"error": "ROI points must be numeric [x, y] pairs"}
+    roi_polygons[source] = polygon
+    save_roi_config()
+    return {"source": source, "points": roi_polygons[source]}
+
+@app.delete("/roi/{source}")
+async def delete_roi(source: str):
+    removed = roi_polygons.pop(source, None)
+    if removed is not None:
+        save_roi_config()
+    return {"source": source, "removed": removed is not None}
+
+@app.get("/search")
+def search_reads(
+    plate: Optional[str] = None,
+    prefix: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    source: Optional[str] = None,
+    limit: int = 100,
+    fuzzy: bool = False,
+    max_distance: float = 1.0,
+    accept: Optional[str] = Header(None),
+):
+    if event_store is None:
+        return {"error": "Event store disabled", "results": []}
+    limit = min(max(1, limit), 1000)
+    if fuzzy:
+        if not plate:
+            return {"error": "Fuzzy search needs a plate", "results": []}
+        # The symmetric-delete index only guarantees recall up to one edit
+        max_distance = min(max(0.0, max_distance), 1.0)
+        results = event_store.fuzzy_search(plate, max_distance, since, until, source, limit)
+    else:
+        results = event_store.search(plate, prefix, since, until, source, limit)
+    return negotiated_response({"results": results}, accept)
+
+@app.on_event("shutdown")
+def close_event_store():
+    if event_store is not None:
+        event_store.close()
+
+@app.get("/watchlists")
+async def list_watchlists():
+    return {"watchlists": {name: len(w) for name, w in watchlists.lists.items()}}
+
+WATCHLIST_NAME_ERROR = "Watchlist names may only contain letters, digits, _ and -"
+
+@app.put("/watchlists/{name}")
+async def upload_watchlist(name: str, file: UploadFile = File(...)):
+    if not is_valid_name(name):
+        return {"error": WATCHLIST_NAME_ERROR}
+    contents = (await file.read()).decode("utf-8", errors="ignore")
+    # One plate per line; for CSV uploads the first column is the plate
+    plates = [line.split(",")[0] for line in contents.splitlines()]
+    compiled = await asyncio.to_thread(watchlists.replace, name, plates)
+    print(f"📋 Watchlist '{name}' compiled: {len(compiled)} plate(s)")
+    return {"name": name, "plates": len(compiled)}
+
+@app.delete("/watchlists/{name}")
+async def delete_watchlist(name: str):
+    if not is_valid_name(name):
+        return {"error": WATCHLIST_NAME_ERROR}
+    return {"name": name, "removed": watchlists.remove(name)}
+
+@app.get("/alerts")
+async def get_alerts(since_id: int = 0, limit: int = 100):
+    return {"alerts": watchlists.alerts_since(since_id, min(max(1, limit), 1000))}
+
+@app.get("/alerts/stream")
+async def stream_alerts(since_id: int = 0):
+    async def events():
+        last_id = since_id
+        while True:
+            for alert in watchlists.alerts_since(last_id, 1000):
+                last_id = alert["id"]
+                yield f"id: {alert['id']}\ndata: {json.dumps(alert)}\n\n"
+            await asyncio.sleep(0.5)
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/admin/profile")
+async def sample_profile(
+    seconds: float = 10,
+    interval_ms: float = 5,
+    x_admin_token: Optional[str] = Header(None),
+):
+    if not is_admin(x_admin_token):
+        return admin_forbidden()
+    if not profile_lock.acquire(blocking=False):
+        return JSONResponse(status_code=409, content={"error": "A profile is already running"})
+    try:
+        seconds = min(max(0.1, seconds), PROFILE_MAX_SECONDS)
+        print(f"🔬 Sampling profile for {seconds:.1f}s")
+        stacks = await asyncio.to_thread(sample_stacks, seconds, max(1.0, interval_ms) / 1000.0)
+    finally:
+        profile_lock.release()
+    return PlainTextResponse(
+        collapsed(stacks),
+        headers={"Content-Disposition": f'attachment; filename="profile-{int(time.time())}.collapsed"'},
+    )
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    if not is_admin(x_admin_token):
+        return admin_forbidden()
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+    if not re.fullmatch(r"[0-9a-f]{32}", profile_id) or not os.path.exists(path):
+        return JSONResponse(status_code=404, content={"error": "Unknown profile"})
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "queue": dict(queue_stats, max_depth=MAX_QUEUE_DEPTH, depth_limits=QUEUE_DEPTH_LIMITS,
+                      depth_by_priority=dict(queue_stats["depth_by_priority"])),
+        "priority_queued": inference_pool.depths(),
+        "priority_served": dict(inference_pool.served),
+        "stage_estimates_ms": {k: round(v, 1) for k, v in stage_estimates_ms.items()},
+    }
 
 @app.get("/test")
 async def test():
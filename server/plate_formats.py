@@ -0,0 +1,122 @@
+import json
+import os
+
+from store import normalize_plate
+
+# Position-aware corrections between look-alike letters and digits
+DIGIT_TO_LETTER = {"0": "O", "1": "I", "2": "Z", "4": "A", "5": "S", "6": "G", "7": "T", "8": "B"}
+LETTER_TO_DIGIT = {"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2",
+                   "A": "4", "S": "5", "G": "6", "T": "7", "B": "8"}
+
+# Score multiplier per corrected character
+CORRECTION_PENALTY = 0.85
+
+def compile_template(template):
+    """Compile a template such as "LLDD LLL" into per-position slots.
+
+    L is a letter, D a digit, A any letter or digit; any other letter or
+    digit must match literally. Spaces and punctuation are ignored.
+    """
+    slots = []
+    for ch in template.upper():
+        if ch in "LDA":
+            slots.append(ch)
+        elif ch.isalnum():
+            slots.append("=" + ch)
+    return tuple(slots)
+
+def fit_template(plate, slots):
+    """Fit a normalized plate to template slots.
+
+    Returns (corrected_plate, corrections), or None when a character can
+    not be read as what the slot expects.
+    """
+    corrected = []
+    corrections = 0
+    for ch, slot in zip(plate, slots):
+        if slot == "A":
+            corrected.append(ch)
+        elif slot == "L":
+            if ch.isalpha():
+                corrected.append(ch)
+            elif ch in DIGIT_TO_LETTER:
+                corrected.append(DIGIT_TO_LETTER[ch])
+                corrections += 1
+            else:
+                return None
+        elif slot == "D":
+            if ch.isdigit():
+                corrected.append(ch)
+            elif ch in LETTER_TO_DIGIT:
+                corrected.append(LETTER_TO_DIGIT[ch])
+                corrections += 1
+            else:
+                return None
+        else:
+            literal = slot[1]
+            if ch == literal:
+                corrected.append(ch)
+            elif DIGIT_TO_LETTER.get(ch) == literal or LETTER_TO_DIGIT.get(ch) == literal:
+                corrected.append(literal)
+                corrections += 1
+            else:
+                return None
+    return "".join(corrected), corrections
+
+class PlateFormatEngine:
+    """Per-region plate syntax used to correct and rank OCR candidates.
+
+    Config is JSON: {"regions": {name: [template, ...]}, "sources":
+    {source: region}, "default_region": name}.
+    """
+    def __init__(self, config=None):
+        config = config or {}
+        self.sources = dict(config.get("sources", {}))
+        self.default_region = config.get("default_region")
+        # {region: {length: [slots, ...]}} so candidates only meet same-length templates
+        self.regions = {}
+        for region, templates in config.get("regions", {}).items():
+            by_length = {}
+            for template in templates:
+                slots = compile_template(template)
+                by_length.setdefault(len(slots), []).append(slots)
+            self.regions[region] = by_length
+
+    @classmethod
+    def from_file(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def region_for(self, source):
+        """Region configured for a source, falling back to the default"""
+        region = self.sources.get(source, self.default_region) if source else self.default_region
+        return region if region in self.regions else None
+
+    def validate(self, text, region):
+        """Best (corrected_plate, corrections) for text in region, or None"""
+        plate = normalize_plate(text)
+        best = None
+        for slots in self.regions[region].get(len(plate), ()):
+            fitted = fit_template(plate, slots)
+            if fitted is not None and (best is None or fitted[1] < best[1]):
+                best = fitted
+        return best
+
+    def select(self, candidates, region):
+        """Pick the best (text, confidence) candidate under region syntax.
+
+        Confidence is discounted per corrected character; candidates that
+        fit no template are dropped. Returns None if none survive.
+        """
+        best = None
+        for text, conf in candidates:
+            fitted = self.validate(text, region)
+            if fitted is None:
+                continue
+            plate, corrections = fitted
+            score = conf * CORRECTION_PENALTY ** corrections
+            if best is None or score > best[1]:
+                best = (plate, score)
+        return best
@@ -0,0 +1,49 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def sample_stacks(seconds, interval=0.005):
+    """Sample every thread's Python stack for a while.
+
+    Returns a Counter of collapsed stacks ("thread;outer;...;inner") usable
+    by flamegraph.pl, speedscope and similar tools.
+    """
+    me = threading.get_ident()
+    names = {}
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if len(names) != threading.active_count():
+            names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return stacks
+
+def collapsed(stacks):
+    """Render sampled stacks in collapsed-stack text format"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+def profile_call(path, fn, *args):
+    """Run fn(*args) under cProfile and dump the stats to path"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn(*args)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
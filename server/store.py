@@ -0,0 +1,243 @@
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from fuzzy import confusion_distance, fold_confusions, index_keys
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reads (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT,
+    plate TEXT NOT NULL,
+    plate_norm TEXT NOT NULL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    yolo_confidence REAL,
+    ocr_confidence REAL
+);
+CREATE INDEX IF NOT EXISTS idx_reads_plate_ts ON reads(plate_norm, ts);
+CREATE INDEX IF NOT EXISTS idx_reads_ts ON reads(ts);
+CREATE TABLE IF NOT EXISTS plate_variants (
+    variant TEXT NOT NULL,
+    plate_norm TEXT NOT NULL,
+    PRIMARY KEY (variant, plate_norm)
+) WITHOUT ROWID;
+"""
+
+def normalize_plate(text):
+    """Normalize plate text for indexing: uppercase alphanumerics only"""
+    return re.sub(r'[^A-Z0-9]', '', str(text).upper())
+
+class EventStore:
+    """SQLite (WAL) store of plate reads.
+
+    Inserts are queued and written in batches by a background thread so the
+    request path only pays for a queue put. At most max_pending reads wait
+    in the queue; beyond that new reads are dropped. Reads use one
+    connection per calling thread.
+    """
+    def __init__(self, path, batch_size=500, flush_interval=0.5, max_pending=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+        self.writer = threading.Thread(target=self._write_loop, name="event-store", daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self.local.conn = conn
+        return conn
+
+    def record(self, detections, source=None, ts=None):
+        """Queue the readable detections of one frame for insertion"""
+        ts = time.time() if ts is None else ts
+        for det in detections:
+            if det.get("ocr_confidence", 0) <= 0:
+                continue
+            plate_norm = normalize_plate(det["text"])
+            if not plate_norm:
+                continue
+            x1, y1, x2, y2 = det["box"]
+            try:
+                self.pending.put_nowait((ts, source, det["text"], plate_norm, x1, y1, x2, y2,
+                                         det["yolo_confidence"], det["ocr_confidence"]))
+            except queue.Full:
+                self.dropped += 1
+                print(f"⚠️ Event store queue full, dropped read {det['text']!r} ({self.dropped} dropped so far)")
+
+    def _index_plates(self, conn, plates):
+        """Add symmetric-delete fuzzy keys for plates not indexed yet"""
+        for plate in plates:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO plate_variants (variant, plate_norm) VALUES (?, ?)",
+                (fold_confusions(plate), plate),
+            )
+            if cursor.rowcount:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO plate_variants (variant, plate_norm) VALUES (?, ?)",
+                    [(key, plate) for key in index_keys(plate)],
+                )
+
+    def _backfill_index(self, conn):
+        """Build the fuzzy index for reads stored before it existed"""
+        if conn.execute("SELECT 1 FROM plate_variants LIMIT 1").fetchone():
+            return
+        plates = [row[0] for row in conn.execute("SELECT DISTINCT plate_norm FROM reads")]
+        if plates:
+            with conn:
+                self._index_plates(conn, plates)
+            print(f"✅ Fuzzy index built for {len(plates)} plate(s)")
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            self._backfill_index(conn)
+        except Exception as e:
+            # Fuzzy search misses older reads, but new reads keep being stored
+            print(f"❌ Fuzzy index backfill failed: {e}")
+        while True:
+            rows = [self.pending.get()]
+            if rows[0] is None:
+                return
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(rows) < self.batch_size:
+                try:
+                    row = self.pending.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                rows.append(row)
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO reads (ts, source, plate, plate_norm, x1, y1, x2, y2, "
+                        "yolo_confidence, ocr_confidence) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    self._index_plates(conn, {row[3] for row in rows})
+            except Exception as e:
+                print(f"❌ Event store write failed ({len(rows)} rows): {e}")
+            if stop:
+                return
+
+    def close(self):
+        """Flush queued reads and stop the writer"""
+        try:
+            self.pending.put(None, timeout=10)
+        except queue.Full:
+            print("❌ Event store writer is not draining; queued reads are lost")
+            return
+        self.writer.join(timeout=10)
+
+    def search(self, plate=None, prefix=None, since=None, until=None, source=None, limit=100):
+        """Search reads by exact or prefix plate and/or time range, newest first"""
+        clauses = []
+        params = []
+        if plate:
+            clauses.append("plate_norm = ?")
+            params.append(normalize_plate(plate))
+        elif prefix:
+            # Range scan so the plate_norm index serves prefix queries
+            start = normalize_plate(prefix)
+            clauses.append("plate_norm >= ? AND plate_norm < ?")
+            params += [start, start + "\uffff"]
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if source:
+            clauses.append("source = ?")
+            params.append(source)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(
+            f"SELECT * FROM reads {where} ORDER BY ts DESC LIMIT ?", params + [limit]
+        ).fetchall()
+        return [self._row_to_read(row) for row in rows]
+
+    def fuzzy_search(self, plate, max_distance=1.0, since=None, until=None, source=None, limit=100):
+        """Search reads within a confusion-aware edit distance of plate.
+
+        Candidates come from the symmetric-delete index, so only plates
+        sharing a folded key or one-delete variant are scored.
+        """
+        query = normalize_plate(plate)
+        if not query:
+            return []
+
+        keys = list(index_keys(query))
+        conn = self._reader()
+        candidates = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT plate_norm FROM plate_variants WHERE variant IN ({','.join('?' * len(keys))})",
+            keys,
+        )]
+        distances = {}
+        for candidate in candidates:
+            distance = confusion_distance(query, candidate, max_distance)
+            if distance <= max_distance:
+                distances[candidate] = distance
+        if not distances:
+            return []
+
+        clauses = [f"plate_norm IN ({','.join('?' * len(distances))})"]
+        params = list(distances)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if source:
+            clauses.append("source = ?")
+            params.append(source)
+
+        # Rank by distance in SQL so the limit keeps the closest matches
+        rank = "CASE plate_norm " + "WHEN ? THEN ? " * len(distances) + "END"
+        rank_params = [value for item in distances.items() for value in item]
+        rows = conn.execute(
+            f"SELECT * FROM reads WHERE {' AND '.join(clauses)} ORDER BY {rank}, ts DESC LIMIT ?",
+            params + rank_params + [limit],
+        ).fetchall()
+        results = []
+        for row in rows:
+            read = self._row_to_read(row)
+            read["distance"] = round(distances[row["plate_norm"]], 2)
+            results.append(read)
+        return results
+
+    @staticmethod
+    def _row_to_read(row):
+        return {
+            "id": row["id"],
+            "ts": row["ts"],
+            "source": row["source"],
+            "text": row["plate"],
+            "plate": row["plate_norm"],
+            "box": [row["x1"], row["y1"], row["x2"], row["y2"]],
+            "yolo_confidence": row["yolo_confidence"],
+            "ocr_confidence": row["ocr_confidence"],
+        }
@@ -0,0 +1,184 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+# Span currently open in this context (request coroutine or worker task)
+current_span = contextvars.ContextVar("current_span", default=None)
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class Span:
+    def __init__(self, tracer, name, trace_id, parent_id, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.token = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def __enter__(self):
+        self.token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        current_span.reset(self.token)
+        self.tracer.export(self)
+        return False
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+class NoopSpan:
+    """Stand-in when tracing is off or the trace is not sampled.
+
+    An unsampled root is entered like a real span so its children see it
+    and stay unsampled too.
+    """
+    traceparent = None
+
+    def __init__(self, root=False):
+        self.root = root
+        self.token = None
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        if self.root:
+            self.token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.token is not None:
+            current_span.reset(self.token)
+        return False
+
+NOOP_SPAN = NoopSpan()
+
+class Tracer:
+    """Minimal OpenTelemetry-compatible tracer.
+
+    Spans are exported as OTLP/JSON, either appended to a file (one
+    ExportTraceServiceRequest per line) or POSTed to a collector's
+    /v1/traces endpoint, from a background thread. `target` is
+    "file:<path>" or "otlp:<url>"; empty disables tracing.
+    """
+    def __init__(self, target="", sample_rate=1.0, service_name="license-plate-api",
+                 flush_interval=1.0):
+        self.enabled = bool(target)
+        self.target = target
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue()
+        if self.enabled:
+            threading.Thread(target=self._export_loop, name="tracing", daemon=True).start()
+
+    def span(self, name, traceparent=None, **attributes):
+        """Open a span under the current span, or a new (sampled) trace"""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = current_span.get()
+        if isinstance(parent, NoopSpan):
+            return NOOP_SPAN
+        if parent is not None:
+            return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+        remote = parse_traceparent(traceparent)
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+            # Follow the upstream sampling decision
+            if not sampled:
+                return NoopSpan(root=True)
+            return Span(self, name, trace_id, parent_id, attributes)
+        if random.random() >= self.sample_rate:
+            return NoopSpan(root=True)
+        return Span(self, name, "%032x" % random.getrandbits(128), None, attributes)
+
+    def export(self, span):
+        self.pending.put(span)
+
+    def _envelope(self, spans):
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "alpr"}, "spans": [s.to_otlp() for s in spans]}],
+        }]}
+
+    def _write(self, spans):
+        payload = json.dumps(self._envelope(spans))
+        kind, _, destination = self.target.partition(":")
+        if kind == "file":
+            with open(destination, "a") as f:
+                f.write(payload + "\n")
+        elif kind == "otlp":
+            request = urllib.request.Request(destination, data=payload.encode(), method="POST",
+                                             headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+
+    def _export_loop(self):
+        while True:
+            spans = [self.pending.get()]
+            time.sleep(self.flush_interval)
+            while not self.pending.empty():
+                spans.append(self.pending.get_nowait())
+            try:
+                self._write(spans)
+            except Exception as e:
+                print(f"❌ Trace export failed ({len(spans)} spans): {e}")
+
+def parse_traceparent(header):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = int(parts[3], 16) & 1
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(sampled)
+
+def tracer_from_env():
+    return Tracer(os.environ.get("TRACE_EXPORT", ""), float(os.environ.get("TRACE_SAMPLE_RATE", "1.0")))
@@ -0,0 +1,139 @@
+import itertools
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from fuzzy import confusion_distance, delete_variants, fold_confusions
+from store import normalize_plate
+
+class Watchlist:
+    """A compiled, immutable plate matcher.
+
+    Exact hits are a set lookup; fuzzy hits go through dicts keyed by the
+    confusion-folded plate and its one-delete variants, so a read costs a
+    handful of dict lookups regardless of list size.
+    """
+    def __init__(self, name, plates, max_distance=1.0):
+        self.name = name
+        self.max_distance = max_distance
+        self.exact = set()
+        self.folded = {}
+        self.deletes = {}
+        for plate in plates:
+            plate = normalize_plate(plate)
+            if not plate or plate in self.exact:
+                continue
+            self.exact.add(plate)
+            key = fold_confusions(plate)
+            self.folded.setdefault(key, []).append(plate)
+            for variant in delete_variants(key):
+                self.deletes.setdefault(variant, []).append(plate)
+
+    def __len__(self):
+        return len(self.exact)
+
+    def match(self, plate):
+        """Return (entry, distance) for the closest entry, or None"""
+        if plate in self.exact:
+            return plate, 0.0
+
+        key = fold_confusions(plate)
+        candidates = set(self.folded.get(key, ()))
+        candidates.update(self.deletes.get(key, ()))
+        for variant in delete_variants(key):
+            candidates.update(self.folded.get(variant, ()))
+            candidates.update(self.deletes.get(variant, ()))
+
+        best = None
+        for candidate in candidates:
+            distance = confusion_distance(plate, candidate, self.max_distance)
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (candidate, distance)
+        return best
+
+def is_valid_name(name):
+    """Watchlist names double as file names: letters, digits, _ and - only"""
+    return re.fullmatch(r"[\w-]+", name) is not None
+
+class WatchlistRegistry:
+    """Named watchlists plus a bounded in-memory alert stream.
+
+    Lists are compiled off the request path and swapped in with a single
+    reference assignment, so matching never blocks on a reload.
+    """
+    def __init__(self, directory, max_alerts=10000):
+        self.directory = directory
+        self.lists = {}
+        self.alerts = deque(maxlen=max_alerts)
+        self.alert_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def _path(self, name):
+        if not is_valid_name(name):
+            raise ValueError(f"Invalid watchlist name: {name!r}")
+        return os.path.join(self.directory, f"{name}.txt")
+
+    def load_all(self):
+        """Compile every list stored in the watchlist directory"""
+        if not os.path.isdir(self.directory):
+            return
+        for filename in sorted(os.listdir(self.directory)):
+            if filename.endswith(".txt"):
+                with open(os.path.join(self.directory, filename)) as f:
+                    self.replace(filename[:-4], f.read().splitlines(), persist=False)
+
+    def replace(self, name, plates, persist=True):
+        """Compile plates into a list and atomically swap it in"""
+        compiled = Watchlist(name, plates)
+        if persist:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self._path(name) + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write("\n".join(sorted(compiled.exact)))
+            os.replace(tmp_path, self._path(name))
+        with self.lock:
+            lists = dict(self.lists)
+            lists[name] = compiled
+            self.lists = lists
+        return compiled
+
+    def remove(self, name):
+        """Drop a list; returns whether it existed"""
+        with self.lock:
+            lists = dict(self.lists)
+            removed = lists.pop(name, None)
+            self.lists = lists
+        if os.path.exists(self._path(name)):
+            os.remove(self._path(name))
+        return removed is not None
+
+    def check(self, detections, source=None):
+        """Match detections against every list, tagging hits and raising alerts"""
+        lists = self.lists
+        if not lists:
+            return
+        for det in detections:
+            if det.get("ocr_confidence", 0) <= 0:
+                continue
+            plate = normalize_plate(det["text"])
+            if not plate:
+                continue
+            hits = []
+            for watchlist in lists.values():
+                match = watchlist.match(plate)
+                if match is not None:
+                    hits.append({"list": watchlist.name, "entry": match[0], "distance": round(match[1], 2)})
+            if not hits:
+                continue
+            det["watchlist"] = hits
+            for hit in hits:
+                alert = dict(hit, id=next(self.alert_ids), ts=time.time(), source=source,
+                             text=det["text"], box=det["box"])
+                self.alerts.append(alert)
+                print(f"🚨 Watchlist hit: '{det['text']}' ~ {hit['entry']} ({hit['list']})")
+
+    def alerts_since(self, since_id=0, limit=100):
+        """Alerts with id greater than since_id, oldest first"""
+        return [alert for alert in list(self.alerts) if alert["id"] > since_id][:limit]